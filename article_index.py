@@ -0,0 +1,210 @@
+"""
+An inverted index over the articles of a filtered dataset, for answering questions
+like "what fraction of the articles mentioning 'tax' in the second quarter of 2021
+were positive?" without scanning every article.
+
+An article is identified by its position in the dataset (its id). The index holds:
+- for every word of the titles and bodies (in lowercase), the sorted array of the
+  ids of the articles containing it (its posting list)
+- the ids of the articles sorted by publish date, and the sorted publish dates, so
+  the articles published in a date range are found by binary search
+- the body polarity scores, so the articles found by a query can be summarized
+
+Queries combine posting lists and date ranges by intersecting (all_of, and the
+date range of query) or merging (any_of) sorted id arrays, so their cost depends on
+the number of articles that match the terms instead of the size of the dataset.
+"""
+from dataclasses import dataclass
+import datetime
+import re
+from typing import Iterable, Optional
+
+import numpy as np
+
+import columnar as c
+import filtration as f
+
+WORD = re.compile(r'\w+')
+
+EMPTY = np.array([], dtype=np.int32)
+
+
+@dataclass
+class PolaritySummary:
+    """
+    The polarity of the bodies of a set of articles.
+
+    Instance Attributes:
+    - count: The number of articles
+    - positive: The number of articles whose body compound score is above the
+      threshold, like graphing.get_avg_polarity
+    - mean_compound: The average body compound score, or 0.0 if count == 0
+    """
+    count: int
+    positive: int
+    mean_compound: float
+
+    @property
+    def positive_fraction(self) -> float:
+        """Return the fraction of the articles that are positive, or 0.0 if there are none."""
+        return self.positive / self.count if self.count else 0.0
+
+
+class ArticleIndex:
+    """
+    An inverted index over the titles and bodies of a dataset, with the publish dates
+    and body compound scores of its articles.
+
+    >>> data = f.FilteredDataset(
+    ...     ['Tax cuts', 'Bank news', 'New tax'],
+    ...     [datetime.datetime(2021, 4, 2), datetime.datetime(2021, 5, 1),
+    ...      datetime.datetime(2021, 9, 9)],
+    ...     ['Great news for business.', 'The bank is doing badly.', 'Taxes are bad.'],
+    ...     [{'compound': 0.0}] * 3,
+    ...     [{'compound': 0.6}, {'compound': -0.5}, {'compound': -0.4}])
+    >>> index = from_filtered(data)
+    >>> index.all_of('tax').tolist()
+    [0, 2]
+    >>> index.any_of('bank', 'business').tolist()
+    [0, 1]
+    >>> ids = index.query(all_terms=['tax'], start=datetime.datetime(2021, 4, 1),
+    ...                   end=datetime.datetime(2021, 7, 1))
+    >>> ids.tolist()
+    [0]
+    >>> index.polarity(ids).positive_fraction
+    1.0
+
+    Instance Attributes:
+    - postings: Maps every lowercase word to the sorted ids of the articles containing it
+    - date_order: The ids of the articles, sorted by publish date
+    - sorted_dates: The publish dates of the articles in date_order, as datetime64[s]
+    - compound: The body compound score of every article, by id
+    """
+    postings: dict[str, np.ndarray]
+    date_order: np.ndarray
+    sorted_dates: np.ndarray
+    compound: np.ndarray
+
+    def __init__(self, titles: Iterable[str], bodies: Iterable[str],
+                 publish_dates: np.ndarray, compound: np.ndarray) -> None:
+        """
+        Index the articles whose titles, bodies, publish dates (datetime64) and body
+        compound scores are given, in order.
+
+        Preconditions:
+        - titles, bodies, publish_dates and compound all have the same length
+        """
+        lists = {}
+        for i, (title, body) in enumerate(zip(titles, bodies)):
+            for word in set(WORD.findall(title.lower())) | set(WORD.findall(body.lower())):
+                lists.setdefault(word, []).append(i)
+
+        # ids are added in increasing order, so every posting list is already sorted
+        self.postings = {word: np.array(ids, dtype=np.int32) for word, ids in lists.items()}
+
+        publish_dates = np.asarray(publish_dates, dtype='datetime64[s]')
+        self.date_order = np.argsort(publish_dates, kind='stable').astype(np.int32)
+        self.sorted_dates = publish_dates[self.date_order]
+        self.compound = np.asarray(compound, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.compound)
+
+    def term_ids(self, term: str) -> np.ndarray:
+        """Return the sorted ids of the articles containing the word term (ignoring case)."""
+        return self.postings.get(term.lower(), EMPTY)
+
+    def all_of(self, *terms: str) -> np.ndarray:
+        """
+        Return the sorted ids of the articles containing every word in terms.
+
+        Preconditions:
+        - terms != ()
+        """
+        # intersect the shortest posting lists first, so the intermediate results stay small
+        lists = sorted((self.term_ids(term) for term in terms), key=len)
+        ids = lists[0]
+        for other in lists[1:]:
+            ids = np.intersect1d(ids, other, assume_unique=True)
+
+        return ids
+
+    def any_of(self, *terms: str) -> np.ndarray:
+        """Return the sorted ids of the articles containing at least one word in terms."""
+        lists = [self.term_ids(term) for term in terms]
+        if not lists:
+            return EMPTY
+
+        return np.unique(np.concatenate(lists))
+
+    def date_range(self, start: Optional[datetime.datetime] = None,
+                   end: Optional[datetime.datetime] = None) -> np.ndarray:
+        """
+        Return the sorted ids of the articles published in (start, end], like
+        graphing.get_avg_polarity. A missing start or end leaves that side open.
+        """
+        low = 0 if start is None else \
+            np.searchsorted(self.sorted_dates, np.datetime64(start, 's'), side='right')
+        high = len(self.sorted_dates) if end is None else \
+            np.searchsorted(self.sorted_dates, np.datetime64(end, 's'), side='right')
+
+        return np.sort(self.date_order[low:high])
+
+    def query(self, all_terms: Iterable[str] = (), any_terms: Iterable[str] = (),
+              start: Optional[datetime.datetime] = None,
+              end: Optional[datetime.datetime] = None) -> np.ndarray:
+        """
+        Return the sorted ids of the articles that contain every word in all_terms and
+        at least one word in any_terms (if any_terms is not empty), and were published
+        in (start, end]. Every condition that is not given matches all the articles.
+        """
+        parts = []
+        all_terms = list(all_terms)
+        any_terms = list(any_terms)
+        if all_terms:
+            parts.append(self.all_of(*all_terms))
+        if any_terms:
+            parts.append(self.any_of(*any_terms))
+        if start is not None or end is not None:
+            parts.append(self.date_range(start, end))
+
+        if not parts:
+            return np.arange(len(self), dtype=np.int32)
+
+        parts.sort(key=len)
+        ids = parts[0]
+        for other in parts[1:]:
+            ids = np.intersect1d(ids, other, assume_unique=True)
+
+        return ids
+
+    def polarity(self, ids: np.ndarray,
+                 threshold: float = c.POSITIVE_THRESHOLD) -> PolaritySummary:
+        """Return the PolaritySummary of the bodies of the articles with the given ids."""
+        scores = self.compound[ids]
+        if len(scores) == 0:
+            return PolaritySummary(0, 0, 0.0)
+
+        return PolaritySummary(len(scores),
+                               int(np.count_nonzero(scores > np.float32(threshold))),
+                               float(scores.mean()))
+
+
+def from_filtered(data: f.FilteredDataset) -> ArticleIndex:
+    """Return the ArticleIndex of the articles of data."""
+    return ArticleIndex(data.titles, data.bodies,
+                        np.array(data.publish_dates, dtype='datetime64[s]'),
+                        np.array([score['compound'] for score in data.body_polarity_scores],
+                                 dtype=np.float32))
+
+
+def from_columnar(data: c.ColumnarDataset) -> ArticleIndex:
+    """Return the ArticleIndex of the articles of data."""
+    return ArticleIndex((data.titles[i] for i in range(len(data))),
+                        (data.bodies[i] for i in range(len(data))),
+                        data.publish_dates, data.body_scores['compound'])
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
+import array
 import datetime
 import csv
+import os
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
@@ -29,56 +31,189 @@ EMPLOYEE_SIZE = [
 ]
 
 
+CSV_FILES = [
+    'dataset/dataset_2020_07_14.csv',
+    'dataset/dataset_2020_11_13.csv',
+    'dataset/dataset_2021_03_05.csv',
+    'dataset/dataset_2021_05_28.csv',
+    'dataset/dataset_2021_08_27.csv'
+]
+
+# ONLY load_file() can modify this global variable
+FILE_CACHE = {}
+# format: FILE_CACHE = {file: (modification time, CSVColumns of the rows, index of the rows)}
+
+
+def survey_date(file: str) -> datetime.date:
+    """
+    Returns the survey date in the name of a csv dataset.
+
+    >>> survey_date('dataset/dataset_2020_07_14.csv')
+    datetime.date(2020, 7, 14)
+    """
+    name = os.path.splitext(os.path.basename(file))[0]
+    year, month, day = name.split('_')[-3:]
+    return datetime.date(int(year), int(month), int(day))
+
+
+SURVEY_DATES = [survey_date(file) for file in CSV_FILES]
+SURVEY_FILES = dict(zip(SURVEY_DATES, CSV_FILES))
+
+
 def load_data() -> list[list[CSV_Item]]:
     """Load data from csv files"""
-    csv_data = [
-        read_csv_data('dataset/dataset_2020_07_14.csv'),
-        read_csv_data('dataset/dataset_2020_11_13.csv'),
-        read_csv_data('dataset/dataset_2021_03_05.csv'),
-        read_csv_data('dataset/dataset_2021_05_28.csv'),
-        read_csv_data('dataset/dataset_2021_08_27.csv')
-    ]
+    csv_data = [load_file(file)[0].items() for file in CSV_FILES]
 
     return csv_data
 
 
-def read_csv_data(file: str) -> list[CSV_Item]:
+def load_file(file: str) -> tuple['CSVColumns', dict[tuple[str, str], float]]:
     """
-    Reads the csv file and returns a list of CSV_Item. Each CSV_Item representing a row (filtered)
+    Returns the rows of the csv file, as CSVColumns, and their index (see build_index).
+    The file is only read again if it was modified since it was last loaded.
+    """
+    mtime = os.stat(file).st_mtime_ns
+    if file not in FILE_CACHE or FILE_CACHE[file][0] != mtime:
+        columns = read_csv_columns(file)
+        FILE_CACHE[file] = (mtime, columns, build_index(columns))
+
+    return FILE_CACHE[file][1], FILE_CACHE[file][2]
+
+
+def build_index(columns: 'CSVColumns') -> dict[tuple[str, str], float]:
+    """
+    Returns a dictionary mapping (time_length, employee_size) to the value
+    bankruptcy_value(columns.items(), time_length, employee_size) would return, for
+    every time_length in LENGTH_OF_TIME_STR and employee_size in EMPLOYEE_SIZE found
+    in the rows.
+    """
+    # the lengths of time and employee sizes matched by each distinct value of the columns
+    time_lengths = [[time_length for time_length in LENGTH_OF_TIME_STR
+                     if time_length in length_of_time.lower()]
+                    for length_of_time in columns.lengths_of_time]
+    employee_sizes = [[employee_size for employee_size in EMPLOYEE_SIZE
+                       if employee_size in business_char]
+                      for business_char in columns.business_chars]
+
+    index = {}
+    for bc, t, value in zip(columns.business_char_codes, columns.length_of_time_codes,
+                            columns.values):
+        for time_length in time_lengths[t]:
+            for employee_size in employee_sizes[bc]:
+                # only the first row of each pair is used, like bankruptcy_value
+                index.setdefault((time_length, employee_size), value)
+
+    return index
+
+
+def lookup_bankruptcy_value(date: datetime.date, time_length: str, employee_size: str) -> float:
+    """
+    Returns the bankruptcy percentage value with given time_length and employee_size in
+    the survey of the given date, like bankruptcy_value, using the cached index of the
+    survey's csv file.
 
     Preconditions:
-    - file is one of the csv datasets
+    - date in SURVEY_DATES
+    - time_length in LENGTH_OF_TIME_STR
+    - employee_size in EMPLOYEE_SIZE
     """
-    csv_data = []
+    index = load_file(SURVEY_FILES[date])[1]
+    return index.get((time_length, employee_size), 0.0)
 
-    with open(file) as csv_file:
-        data = csv.DictReader(csv_file)
-       
-        # the length of time field has different name in different csv files, one of them 
-        # is "Length of time", the other is very long but also starts with "Length of time",
-        # so search for substring "Length of time" to find the field in both cases     
-        # field_length_of_time = [field for field in data.fieldnames if "Length of time" in field][0]
-        found_fields = [field for field in data.fieldnames if "Length of time" in field]
-        field_length_of_time = found_fields[-1]
 
-        for row in data:
-            if row and row["VALUE"]:
+@dataclass
+class CSVColumns:
+    """
+    The filtered rows of a csv dataset, stored column by column in typed arrays.
+    Business characteristics and lengths of time repeat a lot, so each column only
+    stores the index of the row's value in a list of the distinct values.
+
+    Representation Invariants:
+    - len(self.business_char_codes) == len(self.length_of_time_codes) == len(self.values)
+
+    Instance Attributes:
+    - business_chars: The distinct business characteristics of the rows
+    - lengths_of_time: The distinct lengths of time of the rows
+    - business_char_codes: The index in business_chars of each row's business characteristics
+    - length_of_time_codes: The index in lengths_of_time of each row's length of time
+    - values: The percentage value of each row
+    """
+    business_chars: list[str]
+    lengths_of_time: list[str]
+    business_char_codes: array.array
+    length_of_time_codes: array.array
+    values: array.array
 
-                geo = row["GEO"]
-                bc = row["Business characteristics"]
-                t = row[field_length_of_time]
-                val = row["VALUE"]
+    def items(self) -> list[CSV_Item]:
+        """Returns the rows as a list of CSV_Item."""
+        return [CSV_Item("Canada", self.business_chars[bc], self.lengths_of_time[t], value)
+                for bc, t, value in zip(self.business_char_codes, self.length_of_time_codes,
+                                        self.values)]
 
-                if len(found_fields) > 1:
-                    is_bankruptcy = "bankruptcy" in row[found_fields[0]]
-                else:
-                    is_bankruptcy = True
 
-                if is_bankruptcy and geo == "Canada" and bc.endswith("employees"):
-                    item = CSV_Item(geo, bc, t, val)
-                    csv_data.append(item)
+def read_csv_columns(file: str) -> CSVColumns:
+    """
+    Reads the csv file and returns the rows read_csv_data would keep, as CSVColumns.
 
-    return csv_data
+    The needed columns are found once from the header, and lines that cannot be a
+    Canada-wide row about a number of employees are rejected before they are split
+    into fields. Rows whose VALUE is not a number are skipped.
+
+    Preconditions:
+    - file is one of the csv datasets
+    """
+    business_chars = {}
+    lengths_of_time = {}
+    columns = CSVColumns([], [], array.array('H'), array.array('H'), array.array('d'))
+
+    with open(file, newline='') as csv_file:
+        header = next(csv.reader([csv_file.readline()]))
+
+        # the length of time field has different name in different csv files, one of them
+        # is "Length of time", the other is very long but also starts with "Length of time",
+        # so search for substring "Length of time" to find the field in both cases
+        found_fields = [i for i, field in enumerate(header) if "Length of time" in field]
+        geo_i = header.index("GEO")
+        bc_i = header.index("Business characteristics")
+        time_i = found_fields[-1]
+        value_i = header.index("VALUE")
+        check_bankruptcy = len(found_fields) > 1
+
+        # the StatCan csv files have no quoted fields spanning several lines, so each
+        # line is a whole row and can be rejected before it is parsed
+        lines = (line for line in csv_file
+                 if "Canada" in line and "employees" in line and
+                 (not check_bankruptcy or "bankruptcy" in line))
+
+        for row in csv.reader(lines):
+            if row[geo_i] != "Canada" or not row[bc_i].endswith("employees"):
+                continue
+            if check_bankruptcy and "bankruptcy" not in row[found_fields[0]]:
+                continue
+            try:
+                value = float(row[value_i])
+            except ValueError:
+                continue
+
+            bc = row[bc_i]
+            t = row[time_i]
+            columns.business_char_codes.append(business_chars.setdefault(bc, len(business_chars)))
+            columns.length_of_time_codes.append(lengths_of_time.setdefault(t, len(lengths_of_time)))
+            columns.values.append(value)
+
+    columns.business_chars.extend(business_chars)
+    columns.lengths_of_time.extend(lengths_of_time)
+    return columns
+
+
+def read_csv_data(file: str) -> list[CSV_Item]:
+    """
+    Reads the csv file and returns a list of CSV_Item. Each CSV_Item representing a row (filtered)
+
+    Preconditions:
+    - file is one of the csv datasets
+    """
+    return read_csv_columns(file).items()
 
 
 def bankruptcy_value(data: list[CSV_Item], time_length: str, employee_size: str) -> float:
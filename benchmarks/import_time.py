@@ -0,0 +1,78 @@
+"""
+Measures how long it takes to import each module of the project in a fresh Python
+process, and checks that importing them does not load any dataset, create a
+sentiment analyzer or import nltk (so nothing can be downloaded).
+
+Run from the project root:
+    python benchmarks/import_time.py [--budget SECONDS] [--repeat N]
+
+Exits with status 1 if a module takes longer than the budget to import, or if
+importing it does work that should only happen when it is used.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ['bankruptcy', 'filtration', 'graphing', 'export']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the fresh process: imports the module, then reports the import time and any
+# work that was done eagerly
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+eager = []
+if 'nltk' in sys.modules:
+    eager.append('imported nltk')
+if 'scoring' in sys.modules and sys.modules['scoring'].ANALYZER:
+    eager.append('created a sentiment analyzer')
+if 'filtration' in sys.modules and sys.modules['filtration'].BUSINESS_DATA:
+    eager.append('loaded BUSINESS_DATA')
+if 'graphing' in sys.modules and sys.modules['graphing'].COLUMNS:
+    eager.append('loaded the graphing datasets')
+print(json.dumps({{'seconds': elapsed, 'eager': eager}}))
+'''
+
+
+def measure(module: str) -> dict:
+    """Import module in a fresh process and return its import time and eager work."""
+    result = subprocess.run([sys.executable, '-c', PROBE.format(module=module)],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    """Measure every module in MODULES and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='maximum import time per module in seconds (default: 1.0)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of fresh processes per module (default: 3)')
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        runs = [measure(module) for _ in range(args.repeat)]
+        seconds = statistics.median(run['seconds'] for run in runs)
+        eager = sorted({item for run in runs for item in run['eager']})
+
+        status = 'ok'
+        if seconds > args.budget:
+            status = 'too slow'
+        if eager:
+            status = 'eager: ' + ', '.join(eager)
+        failed = failed or status != 'ok'
+
+        print(f'{module:<12} {seconds * 1000:8.1f} ms  {status}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
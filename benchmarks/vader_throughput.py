@@ -0,0 +1,94 @@
+"""
+Compares the throughput of the stock nltk SentimentIntensityAnalyzer with
+vader_batch.BatchSentimentIntensityAnalyzer on the titles and bodies of the datasets,
+and checks that both give exactly the same scores.
+
+Run from the project root:
+    python benchmarks/vader_throughput.py [--source SOURCE ...] [--batch-size N] [--repeat N]
+
+Exits with status 1 if the batch analyzer gives a different score for any text.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import filtration as f  # noqa: E402
+import scoring  # noqa: E402
+from vader_batch import BatchSentimentIntensityAnalyzer  # noqa: E402
+
+
+def load_texts(sources: list[str]) -> list[str]:
+    """Return the titles and bodies of every article of sources."""
+    texts = []
+    for source in sources:
+        body_key = f.KEYWORDS[source]['body_key']
+        for article in f.iter_articles(f.KEYWORDS[source]['file_name']):
+            texts.append(article['title'])
+            texts.append(article[body_key])
+
+    return texts
+
+
+def best_time(function, repeat: int) -> float:
+    """Return the shortest of repeat runs of function, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main() -> None:
+    """Score the texts of the chosen sources with both analyzers and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--source', nargs='+', choices=list(f.KEYWORDS),
+                        default=list(f.KEYWORDS),
+                        help='sources whose texts are scored (default: all)')
+    parser.add_argument('--batch-size', type=int, default=scoring.CHUNK_SIZE,
+                        help='number of texts per batch (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the fastest is reported (default: 3)')
+    args = parser.parse_args()
+
+    from nltk.sentiment import SentimentIntensityAnalyzer
+
+    scoring.ensure_vader_lexicon()
+    stock = SentimentIntensityAnalyzer()
+    batch = BatchSentimentIntensityAnalyzer()
+
+    texts = load_texts(args.source)
+    batches = [texts[i: i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+    characters = sum(len(text) for text in texts)
+
+    expected = [stock.polarity_scores(text) for text in texts]
+    actual = [score for chunk in batches for score in batch.polarity_scores_batch(chunk)]
+    mismatches = [text for text, a, b in zip(texts, expected, actual) if a != b]
+
+    stock_seconds = best_time(lambda: [stock.polarity_scores(text) for text in texts],
+                              args.repeat)
+    batch_seconds = best_time(lambda: [batch.polarity_scores_batch(chunk)
+                                       for chunk in batches], args.repeat)
+
+    print(f'{len(texts)} texts, {characters / 1e6:.1f}M characters, '
+          f'batches of {args.batch_size}')
+    for name, seconds in (('stock', stock_seconds), ('batch', batch_seconds)):
+        print(f'{name:<6} {seconds:8.3f} s  {len(texts) / seconds:10.0f} texts/s  '
+              f'{characters / seconds / 1e6:6.2f} M chars/s')
+    print(f'speedup {stock_seconds / batch_seconds:.2f}x')
+
+    if mismatches:
+        print(f'{len(mismatches)} texts scored differently, e.g. {mismatches[0][:80]!r}')
+    else:
+        print('all scores identical')
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
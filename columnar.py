@@ -0,0 +1,175 @@
+"""
+A columnar version of filtration.FilteredDataset, backed by NumPy arrays.
+
+Instead of one datetime.datetime and two score dictionaries per article, the publish
+dates are stored in a single datetime64 array and each of the four VADER scores of
+the titles and bodies is stored in its own float32 array. The titles and bodies are
+encoded back to back in one buffer, with an array of offsets marking where each
+text starts.
+
+VADER rounds its scores to 4 decimal places, so the float32 scores compare against a
+float32 threshold exactly like the original float scores compare against the float
+threshold, and to_filtered recovers the original scores by rounding.
+"""
+from collections.abc import Sequence
+import datetime
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import numpy as np
+
+import filtration as f
+
+SCORE_KEYS = ('neg', 'neu', 'pos', 'compound')
+
+# Articles with a compound score above this are considered positive
+POSITIVE_THRESHOLD = 0.20
+
+
+@dataclass(eq=False)
+class TextBuffer(Sequence):
+    """
+    A list of strings stored in one utf-8 encoded buffer. A string is only decoded
+    when it is read, and a TextBuffer is equal to any sequence of the same strings.
+
+    Representation Invariants:
+    - len(self.offsets) >= 1
+    - self.offsets[0] == 0 and self.offsets[-1] == len(self.data)
+
+    Instance Attributes:
+    - data: The encoded strings, one after the other
+    - offsets: The position in data where each string starts, followed by len(data)
+    """
+    data: bytes
+    offsets: np.ndarray
+
+    @classmethod
+    def from_strings(cls, strings: Sequence[str]) -> 'TextBuffer':
+        """Return a TextBuffer holding strings, which is strings itself if it is
+        already a TextBuffer."""
+        if isinstance(strings, TextBuffer):
+            return strings
+
+        encoded = [string.encode() for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(b''.join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.data[self.offsets[index]: self.offsets[index + 1]].decode()
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def to_list(self) -> list[str]:
+        """Return the strings in this buffer as a list."""
+        return [self[i] for i in range(len(self))]
+
+
+@dataclass
+class ColumnarDataset:
+    """
+    The titles, publish dates, bodies, and polarity scores of articles in a dataset,
+    stored column by column.
+
+    Representation Invariants:
+    - len(self.titles) == len(self.publish_dates) == len(self.bodies)
+    - all(len(self.title_scores[key]) == len(self.titles) for key in SCORE_KEYS)
+    - all(len(self.body_scores[key]) == len(self.titles) for key in SCORE_KEYS)
+
+    Instance Attributes:
+    - titles: The article titles
+    - publish_dates: The publish date of each article, as datetime64[s]
+    - bodies: The article bodies
+    - title_scores: Maps each key in SCORE_KEYS to the float32 array of that polarity
+      score for every title
+    - body_scores: Maps each key in SCORE_KEYS to the float32 array of that polarity
+      score for every body
+    - article_ids: The filtration.article_id of each article as ascii bytes, or an empty
+      array if the ids are not known
+    - rejected_ids: The sorted filtration.article_id of the articles of the dataset file
+      that were left out, as ascii bytes (see filtration.FilteredDataset.rejected_ids)
+    - duplicate_ids: The sorted filtration.article_id of the articles of the dataset file
+      that were left out as copies, as ascii bytes (see
+      filtration.FilteredDataset.duplicate_ids)
+    """
+    titles: TextBuffer
+    publish_dates: np.ndarray
+    bodies: TextBuffer
+    title_scores: dict[str, np.ndarray]
+    body_scores: dict[str, np.ndarray]
+    article_ids: np.ndarray = field(default_factory=lambda: np.array([], dtype='S32'))
+    rejected_ids: np.ndarray = field(default_factory=lambda: np.array([], dtype='S32'))
+    duplicate_ids: np.ndarray = field(default_factory=lambda: np.array([], dtype='S32'))
+
+    def __len__(self) -> int:
+        return len(self.publish_dates)
+
+    def date_mask(self, start_date: datetime.datetime,
+                  end_date: datetime.datetime) -> np.ndarray:
+        """Return a boolean array marking the articles published in (start_date, end_date]."""
+        start = np.datetime64(start_date, 's')
+        end = np.datetime64(end_date, 's')
+        return (self.publish_dates > start) & (self.publish_dates <= end)
+
+    def positive_mask(self, threshold: float = POSITIVE_THRESHOLD) -> np.ndarray:
+        """Return a boolean array marking the articles whose body compound score is above
+        threshold."""
+        return self.body_scores['compound'] > np.float32(threshold)
+
+    def count_positive(self, start_date: datetime.datetime, end_date: datetime.datetime,
+                       threshold: float = POSITIVE_THRESHOLD) -> tuple[int, int]:
+        """
+        Return the number of positive articles and the number of articles published in
+        (start_date, end_date], like graphing.get_avg_polarity.
+        """
+        in_range = self.date_mask(start_date, end_date)
+        positive = in_range & self.positive_mask(threshold)
+        return int(np.count_nonzero(positive)), int(np.count_nonzero(in_range))
+
+    def to_filtered(self) -> f.FilteredDataset:
+        """Return this dataset as a FilteredDataset. Its titles and bodies are the
+        TextBuffers of this dataset, so a text is only decoded when it is read."""
+        dates = self.publish_dates.astype('datetime64[s]').astype(datetime.datetime)
+        return f.FilteredDataset(self.titles,
+                                 list(dates),
+                                 self.bodies,
+                                 _score_dicts(self.title_scores),
+                                 _score_dicts(self.body_scores),
+                                 [article_id.decode() for article_id in self.article_ids],
+                                 {article_id.decode() for article_id in self.rejected_ids},
+                                 {article_id.decode() for article_id in self.duplicate_ids})
+
+
+def from_filtered(data: f.FilteredDataset) -> ColumnarDataset:
+    """Return a ColumnarDataset holding the articles of data."""
+    return ColumnarDataset(TextBuffer.from_strings(data.titles),
+                           np.array(data.publish_dates, dtype='datetime64[s]'),
+                           TextBuffer.from_strings(data.bodies),
+                           _score_columns(data.title_polarity_scores),
+                           _score_columns(data.body_polarity_scores),
+                           np.array(data.article_ids, dtype='S32'),
+                           np.array(sorted(data.rejected_ids), dtype='S32'),
+                           np.array(sorted(data.duplicate_ids), dtype='S32'))
+
+
+def _score_columns(scores: list[dict[str, float]]) -> dict[str, np.ndarray]:
+    """Return one float32 array per score key from a list of score dictionaries."""
+    return {key: np.fromiter((score[key] for score in scores), dtype=np.float32,
+                             count=len(scores))
+            for key in SCORE_KEYS}
+
+
+def _score_dicts(columns: dict[str, np.ndarray]) -> list[dict[str, float]]:
+    """Return the list of score dictionaries stored in columns."""
+    rows = zip(*(columns[key].tolist() for key in SCORE_KEYS))
+    return [{key: round(value, 4) for key, value in zip(SCORE_KEYS, row)} for row in rows]
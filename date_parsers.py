@@ -0,0 +1,217 @@
+"""
+Parses the publish times of the articles of each source into datetime64 arrays.
+
+Every source names the format of its publish times in filtration.KEYWORDS (the
+'date_format' key), and each format has a DateParser registered in DATE_PARSERS. A
+new format is supported by registering a parser for it with register_date_parser.
+
+A parser turns a whole list of publish times into one datetime64[s] array at once:
+- each distinct publish time is only parsed once, and is remembered by the parser,
+  so publish times shared by many articles (or seen by earlier calls) are reused
+- the dates are converted to datetime64 with one NumPy call instead of building a
+  datetime.datetime per article
+- a publish time that cannot be parsed becomes NaT and is counted in the parser's
+  DateParseStats, instead of raising an error
+
+Like the original converters, only the date is kept: every parsed publish time is at
+midnight.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+import re
+from typing import Optional
+
+import numpy as np
+
+# The number of unparseable publish times kept as examples in DateParseStats
+MAX_FAILED_EXAMPLES = 5
+
+MONTH_NUM = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+             'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+NAT = np.datetime64('NaT', 's')
+
+
+@dataclass
+class DateParseStats:
+    """
+    Counters of the publish times seen by a DateParser.
+
+    Instance Attributes:
+    - parsed: The number of distinct publish times that were parsed
+    - reused: The number of publish times whose date was already known
+    - failed: The number of publish times that could not be parsed
+    - failed_examples: Some of the publish times that could not be parsed
+    """
+    parsed: int = 0
+    reused: int = 0
+    failed: int = 0
+    failed_examples: list[str] = field(default_factory=list)
+
+
+class DateParser(ABC):
+    """
+    Parses publish times of one format into datetime64[s] values.
+
+    Subclasses implement parse_day, and can override parse_unique with a faster way
+    of parsing many publish times at once.
+
+    Instance Attributes:
+    - name: The name of the format
+    - stats: The counters of the publish times seen by this parser
+    """
+    name: str
+    stats: DateParseStats
+    _known: dict[str, np.datetime64]
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.stats = DateParseStats()
+        self._known = {}
+
+    @abstractmethod
+    def parse_day(self, raw_date: str) -> Optional[str]:
+        """Return raw_date as an ISO 'YYYY-MM-DD' date, or None if it cannot be parsed."""
+
+    def parse_unique(self, raw_dates: list[str]) -> np.ndarray:
+        """
+        Return the datetime64[s] array of the distinct publish times raw_dates, with NaT
+        for the publish times that cannot be parsed.
+        """
+        days = []
+        for raw_date in raw_dates:
+            try:
+                day = self.parse_day(raw_date)
+            except (ValueError, KeyError, IndexError):
+                day = None
+            days.append('NaT' if day is None else day)
+
+        return _to_datetime64(days)
+
+    def parse(self, raw_dates: list[str]) -> np.ndarray:
+        """Return the datetime64[s] array of raw_dates, with NaT for the publish times
+        that cannot be parsed."""
+        if not raw_dates:
+            return np.array([], dtype='datetime64[s]')
+
+        # the position of each publish time in the list of distinct publish times
+        positions = {}
+        inverse = np.array([positions.setdefault(raw_date, len(positions))
+                            for raw_date in raw_dates], dtype=np.int64)
+        unique = list(positions)
+
+        new_dates = [raw_date for raw_date in unique if raw_date not in self._known]
+        if new_dates:
+            parsed = self.parse_unique(new_dates)
+            self.stats.parsed += len(new_dates)
+            for raw_date, date in zip(new_dates, parsed):
+                self._known[raw_date] = date
+                if np.isnat(date):
+                    self._record_failure(raw_date)
+
+        self.stats.reused += len(raw_dates) - len(new_dates)
+
+        dates = np.array([self._known[raw_date] for raw_date in unique], dtype='datetime64[s]')
+        return dates[inverse]
+
+    def _record_failure(self, raw_date: str) -> None:
+        """Count raw_date as a publish time that could not be parsed."""
+        self.stats.failed += 1
+        if len(self.stats.failed_examples) < MAX_FAILED_EXAMPLES:
+            self.stats.failed_examples.append(raw_date)
+
+
+class IsoDateParser(DateParser):
+    """
+    Parses ISO 8601 publish times like '2021-11-20T21:36:17.000Z' (the cbc format).
+
+    >>> IsoDateParser('iso').parse(['2021-11-20T21:36:17.000Z', 'soon']).tolist()
+    [datetime.datetime(2021, 11, 20, 0, 0), None]
+    """
+    def parse_day(self, raw_date: str) -> Optional[str]:
+        """Return the date part of raw_date."""
+        if len(raw_date) < 10:
+            return None
+        return raw_date[:10]
+
+    def parse_unique(self, raw_dates: list[str]) -> np.ndarray:
+        """Convert all of raw_dates with one NumPy call, and only parse them one at a
+        time if one of them is not a valid date."""
+        try:
+            return np.array([raw_date[:10] if len(raw_date) >= 10 else 'NaT'
+                             for raw_date in raw_dates], dtype='datetime64[D]') \
+                .astype('datetime64[s]')
+        except ValueError:
+            return super().parse_unique(raw_dates)
+
+
+class MonthDayYearParser(DateParser):
+    """
+    Parses publish times that hold a date like 'November 24, 2021' or 'May. 17, 2020',
+    such as the global ('Posted November 24, 2021 4:32 pm') and star
+    ('Sun., May. 17, 2020') formats. Only the first three letters of the month are used.
+
+    >>> parser = MonthDayYearParser('month_day_year')
+    >>> parser.parse(['Posted November 24, 2021 4:32 pm', 'Sun., May. 7, 2020']).tolist()
+    [datetime.datetime(2021, 11, 24, 0, 0), datetime.datetime(2020, 5, 7, 0, 0)]
+    """
+    _pattern = re.compile(r'\b([A-Z][a-z]{2})[a-z]*\.? (\d{1,2}), (\d{4})\b')
+
+    def parse_day(self, raw_date: str) -> Optional[str]:
+        """Return the first month, day and year found in raw_date as an ISO date."""
+        for match in self._pattern.finditer(raw_date):
+            month, day, year = match.groups()
+            if month in MONTH_NUM:
+                return f'{year}-{MONTH_NUM[month]:02}-{int(day):02}'
+
+        return None
+
+
+# ONLY register_date_parser() can modify this global variable
+DATE_PARSERS = {}
+# format: DATE_PARSERS = {'iso': IsoDateParser('iso'), ...}
+
+
+def register_date_parser(parser: DateParser) -> None:
+    """Register parser as the parser of the publish times in the format parser.name,
+    replacing any parser registered for that format."""
+    DATE_PARSERS[parser.name] = parser
+
+
+def get_date_parser(name: str) -> DateParser:
+    """
+    Return the parser registered for the format name.
+
+    Preconditions:
+    - name in DATE_PARSERS
+    """
+    return DATE_PARSERS[name]
+
+
+def parse_stats() -> dict[str, DateParseStats]:
+    """Return the counters of every registered parser, by format name."""
+    return {name: parser.stats for name, parser in DATE_PARSERS.items()}
+
+
+def _to_datetime64(days: list[str]) -> np.ndarray:
+    """Return the ISO dates (or 'NaT') in days as a datetime64[s] array, with NaT for the
+    dates that do not exist, like February 30."""
+    try:
+        return np.array(days, dtype='datetime64[D]').astype('datetime64[s]')
+    except ValueError:
+        dates = np.full(len(days), NAT)
+        for i, day in enumerate(days):
+            try:
+                dates[i] = np.datetime64(day, 'D')
+            except ValueError:
+                pass
+        return dates
+
+
+register_date_parser(IsoDateParser('iso'))
+register_date_parser(MonthDayYearParser('month_day_year'))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
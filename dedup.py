@@ -0,0 +1,206 @@
+"""
+Finds articles that are copies, or near copies, of articles seen before.
+
+The spiders follow search results recursively, and wire stories are published by
+several outlets, so a dataset can hold the same story many times. A Deduplicator
+remembers every text it has checked, and reports a text as a duplicate when:
+- its normalized text (its words in lowercase, without punctuation or extra
+  whitespace) is exactly the same as an earlier text, found with a hash of the
+  normalized text, or
+- the estimated Jaccard similarity of its set of word shingles (runs of shingle_size
+  words) and those of an earlier text is at least threshold. The similarity is
+  estimated with MinHash signatures, and locality sensitive hashing (LSH) on bands
+  of the signatures finds the earlier texts worth comparing to, so each text is only
+  compared to a few others and checking n texts takes roughly linear time.
+
+The same Deduplicator can check the articles of several sources, to find stories
+that were published by more than one outlet.
+"""
+from dataclasses import dataclass
+import hashlib
+import re
+from typing import Optional
+import zlib
+
+import numpy as np
+
+# A prime larger than every shingle hash (crc32), for the MinHash hash functions
+HASH_PRIME = 4294967311
+
+WORD = re.compile(r'\w+')
+
+
+def article_text(title: str, body: str) -> str:
+    """Return the text of an article that is checked for duplicates."""
+    return title + '\n' + body
+
+
+def exact_key(text: str) -> bytes:
+    """
+    Return the hash of the normalized text of text: two texts are exact duplicates
+    when they have the same key.
+
+    >>> exact_key('The bank,  raised rates.') == exact_key('the bank raised rates')
+    True
+    """
+    return _words_key(WORD.findall(text.lower()))
+
+
+def _words_key(words: list[str]) -> bytes:
+    """Return the exact_key of a text whose lowercase words are words."""
+    return hashlib.blake2b(' '.join(words).encode(), digest_size=16).digest()
+
+
+@dataclass
+class DedupStats:
+    """
+    Counters of the texts checked by a Deduplicator.
+
+    Instance Attributes:
+    - unique: The number of texts that were not duplicates
+    - exact: The number of exact duplicates
+    - near: The number of near duplicates
+    - compared: The number of candidate pairs whose signatures were compared
+    """
+    unique: int = 0
+    exact: int = 0
+    near: int = 0
+    compared: int = 0
+
+
+class Deduplicator:
+    """
+    Finds exact and near duplicates among the texts it is given, one at a time.
+
+    Representation Invariants:
+    - 0 < self.threshold <= 1
+    - self.shingle_size >= 1
+    - self.num_perm % self.bands == 0
+
+    Instance Attributes:
+    - threshold: The estimated Jaccard similarity from which two texts are near
+      duplicates
+    - shingle_size: The number of words in a shingle
+    - num_perm: The number of hash functions in a MinHash signature
+    - bands: The number of LSH bands the signatures are split into. Texts whose
+      signatures agree on all the rows of a band are compared. More bands find
+      candidates with a lower similarity, at the cost of more comparisons.
+    - stats: The counters of the texts checked so far
+    """
+    threshold: float
+    shingle_size: int
+    num_perm: int
+    bands: int
+    stats: DedupStats
+    _a: np.ndarray
+    _b: np.ndarray
+    _exact: dict[bytes, int]
+    _signatures: list[Optional[np.ndarray]]
+    _buckets: list[dict[bytes, list[int]]]
+
+    def __init__(self, threshold: float = 0.8, shingle_size: int = 5, num_perm: int = 64,
+                 bands: int = 16, seed: int = 1) -> None:
+        """
+        Create a Deduplicator that has not seen any text yet. seed picks the MinHash
+        hash functions.
+
+        Preconditions:
+        - 0 < threshold <= 1
+        - shingle_size >= 1
+        - num_perm >= 1 and bands >= 1 and num_perm % bands == 0
+        """
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.bands = bands
+        self.stats = DedupStats()
+
+        # the hash functions (a * x + b) % HASH_PRIME, with a * x + b below 2 ** 64
+        generator = np.random.default_rng(seed)
+        self._a = generator.integers(1, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+        self._b = generator.integers(0, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+
+        self._exact = {}
+        self._signatures = []
+        self._buckets = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        """Return the number of texts that were not duplicates."""
+        return len(self._signatures)
+
+    def check(self, text: str) -> Optional[int]:
+        """
+        Return the index of the earlier text that text duplicates, or None if text is
+        not a duplicate, in which case it is remembered as the next index (starting
+        from 0). Only texts that are not duplicates get an index.
+
+        >>> dedup = Deduplicator(threshold=0.5, shingle_size=2)
+        >>> dedup.check('The bank raised its interest rate by half a point today.')
+        >>> dedup.check('the bank raised  its interest rate by half a point today.')
+        0
+        >>> dedup.check('The bank raised its interest rate by half a point on Monday.')
+        0
+        >>> dedup.check('Small businesses struggle to hire new employees.') is None
+        True
+        >>> len(dedup)
+        2
+        """
+        words = WORD.findall(text.lower())
+        key = _words_key(words)
+        if key in self._exact:
+            self.stats.exact += 1
+            return self._exact[key]
+
+        signature = self.signature(words)
+        if signature is not None:
+            original = self._find_similar(signature)
+            if original is not None:
+                self.stats.near += 1
+                return original
+
+        index = len(self._signatures)
+        self._exact[key] = index
+        self._signatures.append(signature)
+        if signature is not None:
+            for band, bucket in zip(self._band_keys(signature), self._buckets):
+                bucket.setdefault(band, []).append(index)
+
+        self.stats.unique += 1
+        return None
+
+    def signature(self, words: list[str]) -> Optional[np.ndarray]:
+        """Return the MinHash signature of the shingles of words, or None if words is
+        empty."""
+        if not words:
+            return None
+
+        size = min(self.shingle_size, len(words))
+        shingles = {' '.join(words[i: i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+
+        return ((self._a * hashes + self._b) % np.uint64(HASH_PRIME)).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        """Return the key of each band of signature."""
+        return [band.tobytes() for band in np.split(signature, self.bands)]
+
+    def _find_similar(self, signature: np.ndarray) -> Optional[int]:
+        """Return the index of the first remembered text whose estimated similarity to
+        the text of signature is at least self.threshold, or None if there is none."""
+        candidates = set()
+        for band, bucket in zip(self._band_keys(signature), self._buckets):
+            candidates.update(bucket.get(band, ()))
+
+        for index in sorted(candidates):
+            self.stats.compared += 1
+            similarity = np.count_nonzero(self._signatures[index] == signature) / self.num_perm
+            if similarity >= self.threshold:
+                return index
+
+        return None
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,173 @@
+"""
+Renders the graphs without opening a window, for batch jobs on servers.
+
+Any subset of the LENGTH_OF_TIME_STR x EMPLOYEE_SIZE graphs made by
+graphing.generate_graph is rendered in parallel by a pool of processes into a chosen
+output directory, and the time taken by each graph is written to a JSON manifest in
+that directory. This module never imports pygame.
+
+Usage:
+    python export.py                              # every graph into graphs/
+    python export.py --out build --time 0 3 --size 2 --workers 4
+    python export.py --force                      # redraw graphs that are up to date
+    python export.py --batch --animation graphs/all.html
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import os
+import time
+from typing import Optional
+
+import bankruptcy as b
+import graphing as g
+
+# Name of the manifest of timings written in the output directory
+TIMINGS_NAME = 'export.json'
+
+
+def _export_graph(job: tuple[int, int, bool, str]) -> dict:
+    """
+    Renders one graph in a worker process and returns its manifest entry.
+    """
+    time_ind, size_ind, incremental, out_dir = job
+
+    start = time.perf_counter()
+    img_name, fingerprint, rendered = g.render_graph(time_ind, size_ind, incremental, out_dir)
+
+    return {
+        'time_ind': time_ind,
+        'size_ind': size_ind,
+        'file': img_name,
+        'fingerprint': fingerprint,
+        'rendered': rendered,
+        'seconds': time.perf_counter() - start
+    }
+
+
+def export_graphs(combinations: list[tuple[int, int]], out_dir: str = g.GRAPH_DIR,
+                  workers: Optional[int] = None, incremental: bool = True) -> dict:
+    """
+    Renders the graph of every (time_ind, size_ind) in combinations into out_dir with
+    a pool of worker processes (all cpus if workers is None), and returns the
+    manifest of timings, which is also written to TIMINGS_NAME in out_dir.
+
+    Preconditions:
+    - all(time_ind in range(len(b.LENGTH_OF_TIME_STR)) for time_ind, _ in combinations)
+    - all(size_ind in range(len(b.EMPLOYEE_SIZE)) for _, size_ind in combinations)
+    - workers is None or workers >= 1
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    # compute the shared inputs once in this process. Worker processes started with
+    # fork (the default on Linux) inherit them; with spawn (the default on Windows and
+    # macOS) each worker loads them again from the snapshots and csv files
+    g.get_article_series()
+    for file in b.CSV_FILES:
+        b.load_file(file)
+
+    jobs = [(time_ind, size_ind, incremental, out_dir) for time_ind, size_ind in combinations]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        graphs = list(executor.map(_export_graph, jobs))
+
+    # the manifest of out_dir is only written by this process
+    for graph in graphs:
+        if graph['rendered']:
+            g.record_graph(graph['file'], graph['fingerprint'])
+
+    timings = {
+        'out_dir': out_dir,
+        'workers': workers or os.cpu_count(),
+        'total_seconds': time.perf_counter() - start,
+        'graphs': graphs
+    }
+    with open(os.path.join(out_dir, TIMINGS_NAME), 'w') as file:
+        json.dump(timings, file, indent=2)
+
+    return timings
+
+
+def export_batch(combinations: list[tuple[int, int]], out_dir: str = g.GRAPH_DIR,
+                 incremental: bool = True) -> dict:
+    """
+    Renders the graph of every (time_ind, size_ind) in combinations into out_dir in
+    this process with graphing.render_graphs, which shares one figure and one kaleido
+    session between all of them. Returns the manifest of timings, which is also
+    written to TIMINGS_NAME in out_dir.
+
+    Preconditions:
+    - all(time_ind in range(len(b.LENGTH_OF_TIME_STR)) for time_ind, _ in combinations)
+    - all(size_ind in range(len(b.EMPLOYEE_SIZE)) for _, size_ind in combinations)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    graph_timings = {}
+    img_names = g.render_graphs(combinations, incremental, out_dir, graph_timings)
+
+    timings = {
+        'out_dir': out_dir,
+        'workers': 1,
+        'total_seconds': time.perf_counter() - start,
+        'graphs': [{'time_ind': time_ind, 'size_ind': size_ind, 'file': img_name,
+                    **graph_timings[img_name]}
+                   for (time_ind, size_ind), img_name in zip(combinations, img_names)]
+    }
+    with open(os.path.join(out_dir, TIMINGS_NAME), 'w') as file:
+        json.dump(timings, file, indent=2)
+
+    return timings
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Render graphs without opening a window.')
+    parser.add_argument('--out', default=g.GRAPH_DIR,
+                        help='directory to save the graphs in (default: %(default)s)')
+    parser.add_argument('--time', type=int, nargs='+',
+                        choices=range(len(b.LENGTH_OF_TIME_STR)),
+                        help='time_ind values to render (default: all)')
+    parser.add_argument('--size', type=int, nargs='+',
+                        choices=range(len(b.EMPLOYEE_SIZE)),
+                        help='size_ind values to render (default: all)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: number of cpus)')
+    parser.add_argument('--force', action='store_true',
+                        help='redraw graphs even if they are up to date')
+    parser.add_argument('--batch', action='store_true',
+                        help='render every graph in this process, through one kaleido session')
+    parser.add_argument('--animation', metavar='FILE',
+                        help='also save the graphs as frames of one animated html page')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """
+    Renders the graphs selected on the command line and prints a summary.
+    """
+    args = parse_args(argv)
+    time_inds = args.time if args.time is not None else range(len(b.LENGTH_OF_TIME_STR))
+    size_inds = args.size if args.size is not None else range(len(b.EMPLOYEE_SIZE))
+
+    combinations = list(itertools.product(time_inds, size_inds))
+
+    if args.batch:
+        timings = export_batch(combinations, args.out, not args.force)
+    else:
+        timings = export_graphs(combinations, args.out, args.workers, not args.force)
+    for graph in timings['graphs']:
+        status = 'rendered' if graph['rendered'] else 'up to date'
+        print(f"{graph['file']}: {status} in {graph['seconds']:.2f}s")
+    print(f"{len(timings['graphs'])} graphs in {timings['total_seconds']:.2f}s")
+
+    if args.animation is not None:
+        g.write_animation(combinations, args.animation)
+        print(f'animation saved as {args.animation}')
+
+
+if __name__ == '__main__':
+    main()
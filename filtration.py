@@ -7,13 +7,24 @@ difference between 'dataset/articles.json' and the other two datasets. The datet
 function is split into three functions, each specified for a dataset, because each datasets'
 publish times have different formats.
 
-    Users of this module can read a dataset file using read_file, filtrate the articles in the
+    Users of this module can read a dataset file using read_file (or stream its articles one at
+a time with iter_articles, which also reads JSON Lines files), filtrate the articles in the
 dataset related to business using find_business_star_global or find_business_cbc, sort each
 section(title, publish time, and body) of each article in the dataset using sort_start_or_global
 or sort_cbc, analyze each article title and article body's polarity score using polarity_analysis,
 and convert the publish times of articles in the dataset into datetime.datetime format. Lastly, the
 store_to_dataclass functions help gather all the filtered sections of the dataset and store them
-in a dataclass. 
+in a dataclass. Polarity scores are kept in an on-disk cache (see polarity_cache.py and
+get_polarity_cache), so articles whose text has not changed are not scored again.
+Scoring is done by scoring.score_texts, which spreads large inputs over a process pool.
+Publish times are parsed by the date parser registered for each source's date_format in
+date_parsers.py (see parse_publish_dates); articles whose publish time cannot be parsed are
+left out of the FilteredDataset instead of stopping the pipeline.
+
+    The sources are registered with register_source as SourceConfig objects (file, body key,
+business terms, date format and file format), and KEYWORDS holds their settings. Adding an
+outlet only takes a register_source call; pipeline.build_datasets builds all the registered
+sources at the same time in a pool of processes.
 
     This module contains one dataclass: FilteredDataset. Results from sort_cbc,
 sort_start_or_global, datetime_converter_star, datetime_converter_cbc, datetime_converter_global,
@@ -21,10 +32,17 @@ and polarity_analysis can be stored into different attributes of FilteredDataset
 """
 
 import datetime
-from dataclasses import dataclass
+import hashlib
+from dataclasses import dataclass, field
 import json
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
+import re
+import threading
+from typing import Collection, Iterator, Optional
+import numpy as np
+import date_parsers
+import dedup
+from polarity_cache import PolarityCache, lexicon_version
+import scoring
 # import ssl
 
 # try:
@@ -34,27 +52,101 @@ from nltk.sentiment import SentimentIntensityAnalyzer
 # else:
 #     ssl._create_default_https_context = _create_unverified_https_context
 
-nltk.download("vader_lexicon")
+# The VADER lexicon is only downloaded when the first analyzer is created, and only if
+# it is not installed yet (see scoring.get_analyzer)
+# nltk.download("vader_lexicon")
 
 BUSINESS_TERMS = ['business', 'company', 'money', 'bank', 'tax', 'income',
                   'sales', 'employees', 'shop', 'market']
 
-# TODO: ADD DATETIME STUFF LUL
-KEYWORDS = {'cbc': {'file_name': 'dataset/cbc.json',
-                    'body_key': 'description',
-                    'business_terms': BUSINESS_TERMS[:-2]},
-            'global': {'file_name': 'dataset/global.json',
-                       'body_key': 'body',
-                       'business_terms': BUSINESS_TERMS},
-            'star': {'file_name': 'dataset/the_star.json',
-                     'body_key': 'body',
-                     'business_terms': BUSINESS_TERMS}
-            }
+
+@dataclass
+class SourceConfig:
+    """a news outlet whose articles can be filtered, and how to read its dataset
+
+    Instance Attributes:
+    - name: the name the source is registered under, like 'cbc'
+    - file_name: the dataset file holding the articles of the source
+    - body_key: the key of the article bodies in the dataset ('body' or 'description')
+    - business_terms: an article is related to business if its title or body contains
+    one of these terms
+    - date_format: the name of the date_parsers parser of the source's publish times
+    - file_format: 'json' for a JSON array of articles, 'jsonl' for JSON Lines, or None
+    to pick the format from the extension of file_name (see iter_articles)
+    - label: the name of the source in the graphs, and of the graphing module
+    attribute holding its FilteredDataset
+    - graphed: whether the source is shown in the graphs
+    """
+    name: str
+    file_name: str
+    body_key: str
+    business_terms: list[str]
+    date_format: str
+    file_format: Optional[str] = None
+    label: str = ''
+    graphed: bool = True
+
+    def settings(self) -> dict:
+        """return the settings of this source in the KEYWORDS format"""
+        return {'file_name': self.file_name,
+                'body_key': self.body_key,
+                'business_terms': self.business_terms,
+                'date_format': self.date_format,
+                'file_format': self.file_format}
+
+
+# ONLY register_source() can modify these global variables
+SOURCE_REGISTRY = {}
+# format: SOURCE_REGISTRY = {'cbc': SourceConfig('cbc', 'dataset/cbc.json', ...), ...}
+KEYWORDS = {}
+# format: KEYWORDS = {'cbc': SOURCE_REGISTRY['cbc'].settings(), ...}
+
+
+def register_source(config: SourceConfig) -> None:
+    """register config as the source config.name, replacing any source with that name
+
+    Sources that are loaded in worker processes (see pipeline.build_datasets) must be
+    registered when a module is imported, so the workers know them too.
+
+        preconditions:
+        - config.date_format in date_parsers.DATE_PARSERS
+    """
+    if not config.label:
+        config.label = config.name.upper()
+
+    SOURCE_REGISTRY[config.name] = config
+    KEYWORDS[config.name] = config.settings()
+
+
+register_source(SourceConfig('cbc', 'dataset/cbc.json', 'description', BUSINESS_TERMS[:-2],
+                             'iso'))
+register_source(SourceConfig('global', 'dataset/global.json', 'body', BUSINESS_TERMS,
+                             'month_day_year'))
+register_source(SourceConfig('star', 'dataset/the_star.json', 'body', BUSINESS_TERMS,
+                             'month_day_year'))
+# the older, larger crawl of CBC: most of dataset/cbc.json is also in it, so it is not
+# shown in the graphs next to 'cbc'
+register_source(SourceConfig('articles', 'dataset/articles.json', 'description',
+                             BUSINESS_TERMS[:-2], 'iso', graphed=False))
 
 # ONLY load_business_data() can modify this global variable
 BUSINESS_DATA = {}
 # format: BUSINESS_DATA = {'cbc': find_business('cbc'), ...}
 
+# ONLY get_matcher() can modify this global variable
+MATCHERS = {}
+# format: MATCHERS = {(('business', ...), False): TermMatcher(['business', ...], False), ...}
+
+# Number of characters read from a dataset file at a time by iter_json_array
+READ_CHUNK_SIZE = 1 << 16
+
+POLARITY_CACHE_FILE = 'dataset/polarity_cache.bin'
+
+# ONLY get_polarity_cache() can modify this global variable
+POLARITY_CACHE = {}
+# format: POLARITY_CACHE = {POLARITY_CACHE_FILE: PolarityCache(...)}
+POLARITY_CACHE_LOCK = threading.Lock()
+
 
 def read_file(file_name: str) -> list[dict[str, str]]:
     """
@@ -64,10 +156,128 @@ def read_file(file_name: str) -> list[dict[str, str]]:
     - file_name in ['dataset/the_star.json', 'dataset/global.json',
     'dataset/cbc.json']
     """
+    return list(iter_articles(file_name))
+
+
+def iter_articles(file_name: str, file_format: Optional[str] = None) -> \
+        Iterator[dict[str, str]]:
+    """
+    Yield the articles of a dataset one at a time, without loading the whole file.
+
+    If file_format is 'jsonl', or it is None and the file ends in '.jsonl', the file is
+    read as JSON Lines (one article per line), otherwise it is read as a JSON array of
+    articles.
+    """
+    if file_format == 'jsonl' or (file_format is None and file_name.endswith('.jsonl')):
+        return iter_json_lines(file_name)
+    else:
+        return iter_json_array(file_name)
+
+
+def iter_source_articles(source: str) -> Iterator[dict[str, str]]:
+    """
+    Yield the articles of the dataset file of source one at a time.
+
+    preconditions:
+    - source in KEYWORDS
+    """
+    return iter_articles(KEYWORDS[source]['file_name'], KEYWORDS[source]['file_format'])
+
+
+def iter_json_lines(file_name: str) -> Iterator[dict[str, str]]:
+    """
+    Yield the article on each non-blank line of a JSON Lines file.
+    """
     with open(file_name) as file:
-        storage = json.load(file)
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_array(file_name: str, chunk_size: int = READ_CHUNK_SIZE) -> \
+        Iterator[dict[str, str]]:
+    """
+    Yield the elements of the JSON array stored in file_name one at a time.
 
-    return storage
+    The file is read chunk_size characters at a time, and only the part of the file
+    holding the article being decoded is kept in memory.
+
+    preconditions:
+    - chunk_size > 0
+    """
+    decoder = json.JSONDecoder()
+
+    with open(file_name) as file:
+        buffer = ''
+        pos = 0
+        eof = False
+        # what must come next: '[' opening the array, 'first' (an article or the ']' of
+        # an empty array), 'article', 'separator' (',' or ']') or 'end' (only whitespace)
+        expected = '['
+        read_size = chunk_size
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+
+            if pos == len(buffer):
+                if eof:
+                    if expected == 'end':
+                        return
+                    raise ValueError(f'{file_name}: unexpected end of file')
+                buffer = file.read(read_size)
+                pos = 0
+                eof = buffer == ''
+                continue
+
+            char = buffer[pos]
+            if expected == 'end':
+                raise ValueError(f'{file_name}: extra data after the JSON array')
+
+            if expected == '[':
+                if char != '[':
+                    raise ValueError(f'{file_name}: expected a JSON array')
+                expected = 'first'
+                pos += 1
+                continue
+
+            if expected == 'separator' or (expected == 'first' and char == ']'):
+                if char == ']':
+                    expected = 'end'
+                elif char == ',' and expected == 'separator':
+                    expected = 'article'
+                else:
+                    raise ValueError(f'{file_name}: expected , or ] between the articles')
+                pos += 1
+                continue
+
+            if char in ',]':
+                raise ValueError(f'{file_name}: expected an article')
+
+            try:
+                article, end = decoder.raw_decode(buffer, pos)
+                # a number cut by the end of buffer, like 6e for 6e2, decodes as a
+                # shorter number, so the character after it must be in buffer too
+                complete = eof or (end < len(buffer) and buffer[end] not in '0123456789+-.eE')
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+
+            if not complete:
+                # the article continues past the end of buffer, so read more of the file,
+                # doubling the read size so a long article is not decoded too many times
+                more = file.read(read_size)
+                buffer = buffer[pos:] + more
+                pos = 0
+                eof = more == ''
+                read_size *= 2
+                continue
+
+            yield article
+            pos = end
+            expected = 'separator'
+            read_size = chunk_size
 
 
 def load_business_data() -> None:
@@ -80,7 +290,88 @@ def load_business_data() -> None:
         BUSINESS_DATA[x] = find_business(x)
 
 
-def find_business(source: str) -> list[dict[str, str]]:
+class TermMatcher:
+    """
+    Searches a text for any of a list of terms in a single pass, using one compiled
+    regular expression that matches every term. Matching ignores case.
+
+    Instance Attributes:
+    - terms: The terms to search for
+    - word_boundary: Whether a term only matches whole words. If False, a term also
+      matches inside a longer word, like term in text.lower() does.
+    """
+    terms: list[str]
+    word_boundary: bool
+    _pattern: re.Pattern
+    _scanner: re.Pattern
+    _term_patterns: dict[str, re.Pattern]
+    _prefixes: dict[str, list[str]]
+
+    def __init__(self, terms: list[str], word_boundary: bool = False) -> None:
+        """
+        Compile the regular expressions matching terms.
+
+        Preconditions:
+        - terms != []
+        - all(term != '' for term in terms)
+        """
+        self.terms = list(terms)
+        self.word_boundary = word_boundary
+
+        # longer terms come first so the scanner reports the longest term at each position
+        unique_terms = sorted({term.lower() for term in terms}, key=len, reverse=True)
+        self._pattern = re.compile(self._wrap('|'.join(map(re.escape, unique_terms))),
+                                   re.IGNORECASE)
+        self._scanner = re.compile(f'(?=({self._pattern.pattern}))', re.IGNORECASE)
+        self._term_patterns = {term: re.compile(self._wrap(re.escape(term)), re.IGNORECASE)
+                               for term in unique_terms}
+
+        # the shorter terms that start at the same position as each term
+        self._prefixes = {term: [other for other in unique_terms
+                                 if other != term and term.startswith(other)]
+                          for term in unique_terms}
+
+    def _wrap(self, alternation: str) -> str:
+        """Return the pattern matching alternation, as whole words if self.word_boundary."""
+        if self.word_boundary:
+            return rf'\b(?:{alternation})\b'
+        else:
+            return alternation
+
+    def matches(self, *texts: str) -> bool:
+        """Return whether any of the terms appears in any of texts."""
+        return any(self._pattern.search(text) is not None for text in texts)
+
+    def matched_terms(self, *texts: str) -> set[str]:
+        """Return the set of (lowercase) terms that appear in any of texts."""
+        found = set()
+        for text in texts:
+            for match in self._scanner.finditer(text):
+                term = match.group(1).lower()
+                found.add(term)
+                for prefix in self._prefixes[term]:
+                    if self._term_patterns[prefix].match(text, match.start()):
+                        found.add(prefix)
+
+        return found
+
+
+def get_matcher(source: str, word_boundary: bool = False) -> TermMatcher:
+    """return the TermMatcher for the business terms of source, building it the first
+    time those terms are requested. The matchers are kept by their terms, so a source
+    registered again with other terms gets a matcher for its new terms
+
+        preconditions:
+        - source in KEYWORDS
+    """
+    key = (tuple(KEYWORDS[source]['business_terms']), word_boundary)
+    if key not in MATCHERS:
+        MATCHERS[key] = TermMatcher(list(key[0]), word_boundary)
+
+    return MATCHERS[key]
+
+
+def find_business(source: str, word_boundary: bool = False) -> list[dict[str, str]]:
     """filter the articles that are related to business and add them to business_articles
 
         preconditions:
@@ -88,27 +379,37 @@ def find_business(source: str) -> list[dict[str, str]]:
         - body_keyword in ['body', 'description']
 
         cbc articles need to use 'description' as the body_keyword. star and global use 'body'
+        If word_boundary is True, the business terms only match whole words.
     """
-    business_articles = []
+    return list(iter_business(source, word_boundary))
 
-    file_name = KEYWORDS[source]['file_name']
-    body_key = KEYWORDS[source]['body_key']
-    business_terms = KEYWORDS[source]['business_terms']
 
-    for article in read_file(file_name):
-        for term in business_terms:
-            if term in article['title'].lower() or term in article[body_key].lower():
-                business_articles.append(article)
-                break
+def iter_business(source: str, word_boundary: bool = False) -> Iterator[dict[str, str]]:
+    """yield the articles of source that are related to business, while the dataset
+    file is still being read
 
-    return business_articles
+    An article is related to business if its title or body contains one of the business
+    terms of source (as a whole word, if word_boundary is True).
 
+        preconditions:
+        - source in KEYWORDS
+    """
+    body_key = KEYWORDS[source]['body_key']
+    matcher = get_matcher(source, word_boundary)
 
-def sort_articles(source: str) -> tuple[list[str], list[str], list[str]]:
+    for article in iter_source_articles(source):
+        if matcher.matches(article['title'], article[body_key]):
+            yield article
+
+
+def sort_articles(source: str, articles: Optional[list[dict[str, str]]] = None) -> \
+        tuple[list[str], list[str], list[str]]:
     """
     Sort the given dataset's data into three sections:
     titles, publish dates, and bodies.
 
+    articles are the source articles to sort, BUSINESS_DATA[source] by default.
+
     preconditions:
     - file_name in ['dataset/the_star.json', 'dataset/global.json', 'dataset/cbc.json']
     - body_keyword in ['body', 'description']
@@ -126,8 +427,10 @@ def sort_articles(source: str) -> tuple[list[str], list[str], list[str]]:
     bodies = []
 
     body_key = KEYWORDS[source]['body_key']
+    if articles is None:
+        articles = BUSINESS_DATA[source]
 
-    for article in BUSINESS_DATA[source]:
+    for article in articles:
         titles.append(article['title'])
         publish_dates.append(article['publish_time'])
         bodies.append(article[body_key])
@@ -135,83 +438,87 @@ def sort_articles(source: str) -> tuple[list[str], list[str], list[str]]:
     return titles, publish_dates, bodies
 
 
-def polarity_analysis(sorted_data: tuple[list[str], list[str], list[str]]) -> \
+def get_polarity_cache() -> PolarityCache:
+    """return the polarity score cache stored in POLARITY_CACHE_FILE, loading it
+    from disk the first time it is requested. Safe to call from several threads.
+    """
+    with POLARITY_CACHE_LOCK:
+        if POLARITY_CACHE_FILE not in POLARITY_CACHE:
+            scoring.ensure_vader_lexicon()
+            version = lexicon_version(scoring.lexicon_state())
+            POLARITY_CACHE[POLARITY_CACHE_FILE] = PolarityCache(POLARITY_CACHE_FILE, version)
+
+    return POLARITY_CACHE[POLARITY_CACHE_FILE]
+
+
+def polarity_analysis(sorted_data: tuple[list[str], list[str], list[str]],
+                      cache: Optional[PolarityCache] = None,
+                      workers: Optional[int] = None,
+                      segments: Optional[scoring.SegmentPolicy] = None) -> \
         tuple[list[dict[str: float]], list[dict[str: float]]]:
     """return an average polarity score dictionary for every article title
     and article body in the sorted_data parameter
 
+    If cache is given, texts that are already in the cache are not scored again,
+    and the scores of the other texts are added to the cache.
+
+    The texts are scored by scoring.score_texts with the given number of worker
+    processes (all cpus if workers is None). Small inputs are scored serially.
+
+    If segments is given, long bodies are scored segment by segment under that policy
+    (see scoring.score_texts_segmented), which bounds the time spent on one body.
+
     preconditions:
     - sorted_data != ()
     - all(not(x == [] for x in sorted_data))
+    - workers is None or workers >= 1
     """
-    analysis = SentimentIntensityAnalyzer()
+    titles = sorted_data[0]
+    bodies = sorted_data[2]
 
-    title_score_tracker = []
-    body_score_tracker = []
+    if segments is not None:
+        title_score_tracker = scoring.score_texts(titles, workers=workers, cache=cache)
+        body_score_tracker = scoring.score_texts_segmented(bodies, segments, workers, cache)
+        return title_score_tracker, body_score_tracker
 
-    for article_title in sorted_data[0]:
-        score = analysis.polarity_scores(article_title)
-        title_score_tracker.append(score)
+    scores = scoring.score_texts(titles + bodies, workers=workers, cache=cache)
 
-    for article_body in sorted_data[2]:
-        score = analysis.polarity_scores(article_body)
-        body_score_tracker.append(score)
+    title_score_tracker = scores[:len(titles)]
+    body_score_tracker = scores[len(titles):]
 
     return title_score_tracker, body_score_tracker
 
 
-def datetime_converter(source: str) -> list[datetime.datetime]:
-    """Convert the raw publish date data in the source dataset to datetime.datetime format.
+def parse_publish_dates(source: str, articles: Optional[list[dict[str, str]]] = None) -> \
+        np.ndarray:
+    """Return the publish dates of the source articles as a datetime64[s] array, parsed
+    by the date parser of the source's date_format (see date_parsers.py).
+
+    articles are the source articles to convert, BUSINESS_DATA[source] by default.
+    Publish times that cannot be parsed are NaT, and are counted in the parser's stats.
 
         preconditions
-        - source in ['cbc', 'global', 'star']
+        - source in KEYWORDS
+        - KEYWORDS[source]['date_format'] in date_parsers.DATE_PARSERS
     """
+    if articles is None:
+        articles = BUSINESS_DATA[source]
 
-    month_num = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-                 'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
-
-    # ACCUMULATOR date_times: keep track of the publish times in datetime.datetime
-    # format for all the source business articles
-    date_times = []
-
-    # TODO: NEED CLEANUP
-    if source == 'cbc':
-        for article in BUSINESS_DATA[source]:
-            raw_date = article['publish_time']
-            year = int(raw_date[0:4])
-            month = int(raw_date[5: 7])
-            day = int(raw_date[8: 10])
-            date_time = datetime.datetime(year, month, day)
-            date_times.append(date_time)
-
-    elif source == 'global':
-        for article in BUSINESS_DATA[source]:
-            raw_date = article['publish_time']
-            split_lst = str.split(raw_date, ' ')
-            year = int(split_lst[3])
-            raw_month = split_lst[1]
-            short_month = raw_month[0: 3]
-            month = month_num[str(short_month)]
-            raw_day = split_lst[2]
-            raw_day_lst = list(raw_day)
-            raw_day_lst.remove(',')
-            day = int(''.join(raw_day_lst))
-            date_time = datetime.datetime(year, month, day)
-            date_times.append(date_time)
-
-    else:    # source == 'star'
-        for article in BUSINESS_DATA[source]:
-            raw_date = article['publish_time']
-            year = int(raw_date[14: 19])
-            month = month_num[str(raw_date[6: 9])]
-            if raw_date[12].isnumeric():
-                day = int(raw_date[11: 13])
-            else:
-                day = int(raw_date[11])
-            date_time = datetime.datetime(year, month, day)
-            date_times.append(date_time)
+    parser = date_parsers.get_date_parser(KEYWORDS[source]['date_format'])
+    return parser.parse([article['publish_time'] for article in articles])
+
+
+def datetime_converter(source: str, articles: Optional[list[dict[str, str]]] = None) -> \
+        list[Optional[datetime.datetime]]:
+    """Convert the raw publish date data in the source dataset to datetime.datetime format.
+
+    articles are the source articles to convert, BUSINESS_DATA[source] by default.
+    The publish dates that cannot be parsed are None (see parse_publish_dates).
 
-    return date_times
+        preconditions
+        - source in KEYWORDS
+    """
+    return parse_publish_dates(source, articles).astype(datetime.datetime).tolist()
 
 
 @dataclass
@@ -233,35 +540,229 @@ class FilteredDataset:
     - TitlePolarityScores: the list of dictionaries of polarity scores for
     article bodies generated with the nltk
     SentimentIntensityAnalyzer.
+    - article_ids: the article_id of each article, used by update_dataclass to
+    find the articles that have not been processed yet
+    - rejected_ids: the article_id of the articles of the dataset file that were left
+    out because they are not related to business or their publish time cannot be
+    parsed, so update_dataclass does not filter them again
+    - duplicate_ids: the article_id of the business articles with a parsed publish
+    time that were left out as copies of an earlier article. Whether an article is a
+    copy depends on the articles checked before it, so update_dataclass checks them
+    for copies again, but does not filter them or parse their publish time unless
+    they are kept
     """
     titles: list[str]
     publish_dates: list[datetime.datetime]
     bodies: list[str]
     title_polarity_scores: list[dict[str: float]]
     body_polarity_scores: list[dict[str: float]]
+    article_ids: list[str] = field(default_factory=list)
+    rejected_ids: set[str] = field(default_factory=set)
+    duplicate_ids: set[str] = field(default_factory=set)
 
 
-def store_to_dataclass(source: str) -> FilteredDataset:
+def store_to_dataclass(source: str, use_cache: bool = True,
+                       workers: Optional[int] = None) -> FilteredDataset:
     """Store all filtered sections of the given dataset into a FilteredDataset class, such filtered
     sections include: titles, datetime.datetime publish dates, bodies, title polarity scores, and
     body polarity scores.
 
+    If use_cache is True, the polarity scores are looked up in (and saved to) the cache
+    returned by get_polarity_cache, so only new or changed articles are scored.
+    workers is the number of processes used to score them (see polarity_analysis).
+    Articles whose publish time cannot be parsed are left out, and counted in the stats
+    of their date parser (see parse_publish_dates).
+
     preconditions:
-    - file_name == 'dataset/the_star.json'
+    - source in KEYWORDS
     """
 
-    sorted_data = sort_articles(source)
-    polarity = polarity_analysis(sorted_data)
+    articles, publish_dates = _drop_undated(source, BUSINESS_DATA[source])
+    sorted_data = sort_articles(source, articles)
+    if use_cache:
+        cache = get_polarity_cache()
+        polarity = polarity_analysis(sorted_data, cache, workers)
+        cache.save()
+    else:
+        polarity = polarity_analysis(sorted_data, workers=workers)
 
     filtered_data = FilteredDataset(sorted_data[0],
-                                    datetime_converter(source),
+                                    publish_dates.astype(datetime.datetime).tolist(),
                                     sorted_data[2],
                                     polarity[0],
-                                    polarity[1]
+                                    polarity[1],
+                                    [article_id(source, x) for x in articles]
                                     )
     return filtered_data
 
 
+def _drop_undated(source: str, articles: list[dict[str, str]]) -> \
+        tuple[list[dict[str, str]], np.ndarray]:
+    """return the articles of source whose publish time can be parsed, and their
+    publish dates as a datetime64[s] array
+    """
+    publish_dates = parse_publish_dates(source, articles)
+    dated = ~np.isnat(publish_dates)
+    if dated.all():
+        return articles, publish_dates
+
+    return [x for x, keep in zip(articles, dated.tolist()) if keep], publish_dates[dated]
+
+
+def article_id(source: str, article: dict[str, str]) -> str:
+    """return a stable id of an article of source: a hash of its title, publish time
+    and body
+
+        preconditions:
+        - source in KEYWORDS
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for key in ('title', 'publish_time', KEYWORDS[source]['body_key']):
+        digest.update(article[key].encode())
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+def update_dataclass(source: str, filtered_data: FilteredDataset, use_cache: bool = True,
+                     workers: Optional[int] = None,
+                     deduplicator: Optional[dedup.Deduplicator] = None) -> tuple[int, int]:
+    """Bring filtered_data up to date with the dataset file of source (and
+    BUSINESS_DATA[source], if it has been loaded), and return the number of articles
+    added to it and the number of articles removed from it.
+
+    Articles are identified by article_id. The rows of the articles that are still in
+    the dataset file are kept, the rows of the articles that are not (including the old
+    version of an article that was edited, whose article_id changed) are removed, and
+    only the articles that are not in filtered_data, filtered_data.rejected_ids or
+    filtered_data.duplicate_ids are filtered and have their publish dates converted.
+    The articles of filtered_data.duplicate_ids are checked for copies again, and only
+    have their publish dates converted if they are kept. Only the articles that were
+    not in filtered_data are scored. The rows end up in the order of the dataset file,
+    so filtered_data is the same as a dataset built from the current file by
+    pipeline.build_dataset.
+
+    Like in store_to_dataclass, articles whose publish time cannot be parsed are left
+    out. If deduplicator is given, every article of filtered_data is checked by it in
+    the order of the dataset file, and the copies of an article checked before are
+    left out too, like the 'dedup' stage of pipeline.build_dataset does. It must not
+    have checked the articles of source yet.
+
+    preconditions:
+    - source in KEYWORDS
+    - filtered_data was made by pipeline.build_dataset(source), store_to_dataclass(source)
+    or update_dataclass(source, ...), with a deduplicator if and only if deduplicator
+    is given
+    """
+    rows = {x: i for i, x in enumerate(filtered_data.article_ids)}
+    body_key = KEYWORDS[source]['body_key']
+    matcher = get_matcher(source)
+
+    # ACCUMULATOR candidates: the (article_id, row index or new article) of the
+    # business articles of the dataset file, in order
+    candidates = []
+    # ACCUMULATOR rejected_ids: the article_id of the articles of the dataset file that
+    # are left out because they are not related to business or are not dated
+    rejected_ids = set()
+    # ACCUMULATOR duplicate_ids: the article_id of the articles of the dataset file that
+    # are left out as copies
+    duplicate_ids = set()
+    # ACCUMULATOR business: the business articles of the dataset file
+    business = []
+
+    for article in iter_source_articles(source):
+        new_id = article_id(source, article)
+        if new_id in rows:
+            candidates.append((new_id, rows[new_id]))
+        elif new_id in filtered_data.rejected_ids:
+            rejected_ids.add(new_id)
+        elif new_id in filtered_data.duplicate_ids:
+            candidates.append((new_id, article))
+        elif matcher.matches(article['title'], article[body_key]):
+            candidates.append((new_id, article))
+        else:
+            rejected_ids.add(new_id)
+
+        if source in BUSINESS_DATA and (new_id in rows or new_id in filtered_data.duplicate_ids
+                                        or matcher.matches(article['title'], article[body_key])):
+            business.append(article)
+
+    new_dates = _parse_candidate_dates(source, candidates, filtered_data.duplicate_ids)
+    rejected_ids.update(x for x, date in new_dates.items() if date is None)
+    candidates = [(x, article) for x, article in candidates if x not in rejected_ids]
+
+    if deduplicator is not None:
+        kept = []
+        for x, article in candidates:
+            if deduplicator.check(_candidate_text(filtered_data, article, body_key)) is None:
+                kept.append((x, article))
+            else:
+                duplicate_ids.add(x)
+        candidates = kept
+
+    # the copies of the last update that are not copies anymore have not been dated yet
+    new_dates.update(_parse_candidate_dates(source, candidates, new_dates))
+
+    new_articles = [article for _, article in candidates if isinstance(article, dict)]
+    sorted_data = sort_articles(source, new_articles)
+    if not new_articles:
+        polarity = ([], [])
+    elif use_cache:
+        cache = get_polarity_cache()
+        polarity = polarity_analysis(sorted_data, cache, workers)
+        cache.save()
+    else:
+        polarity = polarity_analysis(sorted_data, workers=workers)
+    new_rows = iter(zip(sorted_data[0], sorted_data[2], polarity[0], polarity[1]))
+
+    # ACCUMULATOR columns: the titles, publish dates, bodies, title scores and body
+    # scores of the updated rows
+    columns = ([], [], [], [], [])
+    old_columns = (filtered_data.titles, filtered_data.publish_dates, filtered_data.bodies,
+                   filtered_data.title_polarity_scores, filtered_data.body_polarity_scores)
+    for x, article in candidates:
+        if isinstance(article, dict):
+            title, body, title_scores, body_scores = next(new_rows)
+            row = (title, new_dates[x], body, title_scores, body_scores)
+        else:
+            row = tuple(column[article] for column in old_columns)
+        for column, value in zip(columns, row):
+            column.append(value)
+
+    kept = {x for x, _ in candidates}
+    removed = sum(1 for x in filtered_data.article_ids if x not in kept)
+
+    filtered_data.titles, filtered_data.publish_dates, filtered_data.bodies, \
+        filtered_data.title_polarity_scores, filtered_data.body_polarity_scores = columns
+    filtered_data.article_ids = [x for x, _ in candidates]
+    filtered_data.rejected_ids = rejected_ids
+    filtered_data.duplicate_ids = duplicate_ids
+
+    if source in BUSINESS_DATA:
+        BUSINESS_DATA[source] = business
+
+    return len(new_articles), removed
+
+
+def _parse_candidate_dates(source: str, candidates: list[tuple[str, object]],
+                           skipped: Collection[str]) -> dict[str, Optional[datetime.datetime]]:
+    """return the publish date (or None if it cannot be parsed) of the new articles among
+    the candidates of update_dataclass whose article_id is not in skipped, by article_id"""
+    articles = [(x, article) for x, article in candidates
+                if isinstance(article, dict) and x not in skipped]
+    dates = parse_publish_dates(source, [article for _, article in articles])
+    return {x: date for (x, _), date in zip(articles, dates.tolist())}
+
+
+def _candidate_text(filtered_data: FilteredDataset, article: object, body_key: str) -> str:
+    """return the text checked for duplicates of a candidate of update_dataclass: a new
+    article, or the index of a row of filtered_data"""
+    if isinstance(article, dict):
+        return dedup.article_text(article['title'], article[body_key])
+
+    return dedup.article_text(filtered_data.titles[article], filtered_data.bodies[article])
+
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -3,15 +3,28 @@ Graphs our data using plotly.graph_objects and writes to a png image
 using kaleido.
 """
 import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
 # import csv
+import numpy as np
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
 
 import filtration as f
 import bankruptcy as b
+import columnar as c
+import dedup
+import pipeline as p
+import snapshot as s
 
 # Dependencies:
 # - kaleido
+# - numpy
 # - plotly
 # - csv
 # - datetime
@@ -25,14 +38,175 @@ PUBLISH_DATES = [
     datetime.datetime(2021, 8, 27)
 ]
 
-f.load_business_data()
-CBC = f.store_to_dataclass('cbc')
-GLOBAL = f.store_to_dataclass('global')
-STAR = f.store_to_dataclass('star')
+GRAPH_LAYOUT = {
+    'title': "Positive Media Representation vs Time until Bankruptcy",
+    'xaxis': {'type': 'category'},
+    'yaxis': {
+        'title': 'Percentage'
+    },
+}
+
+# The directory generate_graph saves the graphs in by default
+GRAPH_DIR = 'graphs'
+
+# Every directory generate_graph saves graphs in has a manifest with this name, recording
+# the inputs of every graph so unchanged graphs are not drawn again.
+# format: {graph file name: {'fingerprint': ..., 'png': sha256 of the image}}
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_LOCK = threading.Lock()
+
+# Quarter i covers the articles published in (QUARTER_EDGES[i], QUARTER_EDGES[i + 1]]
+QUARTER_EDGES = [datetime.datetime(2020, 1, 1)] + PUBLISH_DATES
+
+
+def load_datasets(sources: list[str]) -> dict[str, c.ColumnarDataset]:
+    """
+    Returns the dataset of every source in sources in columnar form. A dataset is
+    loaded from the snapshot of its source if that is fresh, otherwise it is made with
+    the filtration pipeline and saved as the new snapshot. The sources that are made
+    again are built at the same time, one worker process per source (see
+    pipeline.build_datasets), and the time each of them took is stored in LOAD_TIMINGS.
+
+    The sources share one Deduplicator, and their articles are checked in the order of
+    sources, so a story published by several of them is only kept in the first one.
+    The dataset of a source depends on the sources before it, so once a source is
+    made again, so are all the sources after it.
+
+    Preconditions:
+    - all(source in f.SOURCE_REGISTRY for source in sources)
+    """
+    datasets = {}
+    for i, source in enumerate(sources):
+        data = s.load_snapshot(source, after=tuple(sources[:i]))
+        if data is None:
+            break
+        datasets[source] = data
+
+    missing = sources[len(datasets):]
+    if missing:
+        # the texts of the snapshots are only decoded when a source is made again
+        deduplicator = dedup.Deduplicator()
+        for data in datasets.values():
+            remember_articles(deduplicator, data)
+
+        built, timings = p.build_datasets(missing, deduplicator=deduplicator)
+        LOAD_TIMINGS.update(timings)
+        for i, source in enumerate(sources):
+            if source in built:
+                datasets[source] = c.from_filtered(built[source])
+                s.save_snapshot(source, datasets[source], after=tuple(sources[:i]))
+
+    return datasets
+
+
+def remember_articles(deduplicator: dedup.Deduplicator, data: c.ColumnarDataset) -> None:
+    """
+    Gives the articles of data to deduplicator, so copies of them are found in the
+    datasets built after data.
+    """
+    for title, body in zip(data.titles, data.bodies):
+        deduplicator.check(dedup.article_text(title, body))
+
+
+# The datasets are only loaded when they are first needed, by get_columns and
+# get_dataset, which can be called from several threads.
+# ONLY get_columns(), get_dataset() and update_datasets() can modify these globals
+COLUMNS = {}
+# format: COLUMNS = {'cbc': load_datasets(list(get_sources().values()))['cbc'], ...}
+FILTERED = {}
+# format: FILTERED = {'cbc': COLUMNS['cbc'].to_filtered(), ...}
+DATASETS_LOCK = threading.RLock()
+# ONLY load_datasets() can modify this global variable
+LOAD_TIMINGS = {}
+# format: LOAD_TIMINGS = {'cbc': seconds taken by the pipeline to build the cbc dataset}
 # CBC = f.store_cbc_to_dataclass('dataset/cbc.json')
 # GLOBAL = f.store_global_to_dataclass('dataset/global.json')
 # STAR = f.store_star_to_dataclass('dataset/the_star.json')
 
+# The article series shown in every graph, derived once per version of COLUMNS.
+# ONLY get_article_series() and invalidate_article_series() can modify these globals
+ARTICLE_SUMMARY = {'version': 0, 'series_version': -1, 'series': []}
+SUMMARY_STATS = {'computed': 0, 'reused': 0}
+
+
+def get_sources() -> dict[str, str]:
+    """
+    Returns the sources shown in the graphs (see filtration.register_source), by the
+    names of the module attributes holding their FilteredDataset. The registry is read
+    at every call, so sources registered after this module is imported are graphed too.
+    """
+    return {config.label: name for name, config in f.SOURCE_REGISTRY.items() if config.graphed}
+
+
+def get_columns() -> dict[str, c.ColumnarDataset]:
+    """
+    Returns the dataset of every source in get_sources() in columnar form, loading the
+    datasets the first time they are requested.
+    """
+    sources = list(get_sources().values())
+    with DATASETS_LOCK:
+        # the sources are deduplicated against each other, so they are loaded together
+        if any(source not in COLUMNS for source in sources):
+            COLUMNS.update(load_datasets(sources))
+
+        return {source: COLUMNS[source] for source in sources}
+
+
+def get_dataset(source: str) -> f.FilteredDataset:
+    """
+    Returns the dataset of source as a FilteredDataset, loading it the first time it
+    is requested.
+
+    Preconditions:
+    - source in get_sources().values()
+    """
+    with DATASETS_LOCK:
+        if source not in FILTERED:
+            FILTERED[source] = get_columns()[source].to_filtered()
+
+        return FILTERED[source]
+
+
+def __getattr__(name: str) -> f.FilteredDataset:
+    """
+    Returns the dataset of a source when its label in get_sources() (like CBC, GLOBAL
+    or STAR) is accessed, so they are only loaded when they are used.
+    """
+    sources = get_sources()
+    if name in sources:
+        return get_dataset(sources[name])
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def update_datasets() -> int:
+    """
+    Brings CBC, GLOBAL and STAR up to date with their dataset files (see
+    filtration.update_dataclass), and updates COLUMNS and the article series. Like in
+    load_datasets, the sources share one Deduplicator and are checked in the order of
+    get_sources(), so articles that are copies of an earlier article of any of them
+    are left out. Returns the number of articles added.
+    """
+    added = 0
+    deduplicator = dedup.Deduplicator()
+    sources = list(get_sources().values())
+    with DATASETS_LOCK:
+        changed = False
+        for i, source in enumerate(sources):
+            data = get_dataset(source)
+            count, removed = f.update_dataclass(source, data, deduplicator=deduplicator)
+            # the snapshot is saved even if no row changed, since it records the state
+            # of the dataset file, the rejected articles and the copies
+            COLUMNS[source] = c.from_filtered(data)
+            s.save_snapshot(source, COLUMNS[source], after=tuple(sources[:i]))
+            added += count
+            changed = changed or count > 0 or removed > 0
+
+        if changed:
+            invalidate_article_series()
+
+    return added
+
 
 def get_avg_polarity(start_date: datetime.datetime, 
                      end_date: datetime.datetime,
@@ -54,6 +228,73 @@ def get_avg_polarity(start_date: datetime.datetime,
     return pos_articles, len(articles)
 
 
+def get_quarter_counts(data: c.ColumnarDataset) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the number of positive articles and the number of articles in data
+    published during each quarter, computed for all quarters in a single pass.
+    """
+    edges = np.array(QUARTER_EDGES, dtype='datetime64[s]')
+
+    # searchsorted returns i + 1 for a date in (edges[i], edges[i + 1]]
+    quarters = np.searchsorted(edges, data.publish_dates, side='left') - 1
+    in_quarter = (quarters >= 0) & (quarters < len(PUBLISH_DATES))
+
+    totals = np.bincount(quarters[in_quarter], minlength=len(PUBLISH_DATES))
+    positives = np.bincount(quarters[in_quarter & data.positive_mask()],
+                            minlength=len(PUBLISH_DATES))
+
+    return positives, totals
+
+
+def get_percentages() -> list[float]:
+    """
+    Returns the percentage of positive articles published during each quarter,
+    over all the datasets in COLUMNS.
+    """
+    total_positive = np.zeros(len(PUBLISH_DATES), dtype=np.int64)
+    total_articles = np.zeros(len(PUBLISH_DATES), dtype=np.int64)
+
+    for data in get_columns().values():
+        positives, totals = get_quarter_counts(data)
+        total_positive += positives
+        total_articles += totals
+
+    return [int(pos) / int(total) * 100 for pos, total in zip(total_positive, total_articles)]
+
+
+def invalidate_article_series() -> None:
+    """
+    Marks the article series as out of date. Must be called whenever the datasets
+    in COLUMNS change.
+    """
+    with DATASETS_LOCK:
+        ARTICLE_SUMMARY['version'] += 1
+
+
+def get_article_series() -> list[float]:
+    """
+    Returns the percentage of positive articles for each quarter, like get_percentages,
+    but only computes it once per version of the datasets.
+    """
+    with DATASETS_LOCK:
+        if ARTICLE_SUMMARY['series_version'] != ARTICLE_SUMMARY['version']:
+            ARTICLE_SUMMARY['series'] = get_percentages()
+            ARTICLE_SUMMARY['series_version'] = ARTICLE_SUMMARY['version']
+            SUMMARY_STATS['computed'] += 1
+        else:
+            SUMMARY_STATS['reused'] += 1
+
+        return list(ARTICLE_SUMMARY['series'])
+
+
+def get_summary_stats() -> dict[str, int]:
+    """
+    Returns how many times the article series was computed, and how many times a
+    computed series was reused instead.
+    """
+    return dict(SUMMARY_STATS)
+
+
 def get_percentage_for_quarter(quarter: int) -> float:
     """
     Returns the percentage of positive articles published during the given quarter.
@@ -61,25 +302,18 @@ def get_percentage_for_quarter(quarter: int) -> float:
     Preconditions:
     - quarter in range(0, 5)
     """
+    return get_article_series()[quarter]
 
-    if quarter == 0:
-        start_date = datetime.datetime(2020, 1, 1)
-    else:
-        start_date = PUBLISH_DATES[quarter - 1]
 
-    end_date = PUBLISH_DATES[quarter]
-
-    global_articles = get_avg_polarity(start_date, end_date, GLOBAL)
-    star_articles = get_avg_polarity(start_date, end_date, STAR)
-    cbc_articles = get_avg_polarity(start_date, end_date, CBC)
-
-    total_positive = global_articles[0] + star_articles[0] + cbc_articles[0]
-    total_articles = global_articles[1] + star_articles[1] + cbc_articles[1]
-
-    return total_positive / total_articles * 100
+def graph_filename(time_ind: int, size_ind: int, out_dir: str = GRAPH_DIR) -> str:
+    """
+    Returns the name generate_graph saves the graph for time_ind and size_ind as.
+    """
+    return os.path.join(out_dir, f'graph{time_ind}_{size_ind}.png')
 
 
-def generate_graph(time_ind: int, size_ind: int) -> str:
+def generate_graph(time_ind: int, size_ind: int, incremental: bool = True,
+                   out_dir: str = GRAPH_DIR) -> str:
     """
     Generates a double bar graph with percentage of positive articles and percentage 
     of businesses that will go bankrupt in a given time for a given number of employees.
@@ -96,7 +330,6 @@ def generate_graph(time_ind: int, size_ind: int) -> str:
     time_ind = 2: Businesses that will go bankrupt in 3 - 6 months
     time_ind = 3: Businesses that will go bankrupt in 6 - 12 months
     time_ind = 4: Businesses that will go bankrupt in more than 12 months
-    time_ind = 5: Businesses that will go bankrupt in unknown time
 
     You can adjust the business size with the size_ind parameter.
     The value of size_ind corresponds to the index for EMPLOYEE_SIZE in bankruptcy.py
@@ -106,49 +339,268 @@ def generate_graph(time_ind: int, size_ind: int) -> str:
     size_ind = 2: Businesses with 20 to 99 employees
     size_ind = 3: Businesses with 100 or more employees
 
+    If incremental is True and the manifest of out_dir shows the saved graph was drawn
+    from the same inputs, the graph is not drawn again.
+
+    Preconditions:
+    - time_ind in range(0, 5)
+    - size_ind in range(0, 4)
+    """
+    img_name, fingerprint, rendered = render_graph(time_ind, size_ind, incremental, out_dir)
+    if rendered:
+        record_graph(img_name, fingerprint)
+
+    return img_name
+
+
+def render_graph(time_ind: int, size_ind: int, incremental: bool = True,
+                 out_dir: str = GRAPH_DIR) -> tuple[str, str, bool]:
+    """
+    Does the work of generate_graph, without recording the graph in the manifest.
+    Returns the name of the graph, the fingerprint of its inputs, and whether it was
+    drawn (False if it was already up to date).
+
+    Preconditions:
+    - time_ind in range(0, 5)
+    - size_ind in range(0, 4)
+    """
+    img_name = graph_filename(time_ind, size_ind, out_dir)
+
+    article_series = get_article_series()
+    bankruptcy_series, bankruptcy_name = get_bankruptcy_series(time_ind, size_ind)
+
+    fingerprint = graph_fingerprint(article_series, bankruptcy_series, bankruptcy_name)
+    if incremental and is_graph_current(img_name, fingerprint):
+        return img_name, fingerprint, False
+
+    fig = build_figure(article_series, bankruptcy_series, bankruptcy_name)
+    fig.write_image(img_name, format='png')
+    return img_name, fingerprint, True
+
+
+def render_graphs(combinations: list[tuple[int, int]], incremental: bool = True,
+                  out_dir: str = GRAPH_DIR,
+                  timings: Optional[dict[str, dict]] = None) -> list[str]:
+    """
+    Generates the graph of every (time_ind, size_ind) in combinations, like
+    generate_graph, and returns their names.
+
+    The figure is only built once. For each graph, only the y values and name of the
+    bankruptcy trace are swapped, and all the graphs are sent to kaleido in a single
+    call, so they share one kaleido session.
+
+    If timings is given, it is filled with the fingerprint of every graph, whether it
+    was drawn and the seconds it took, by graph name. The time of the single kaleido
+    call is split evenly between the graphs that were drawn.
+
+    Preconditions:
+    - all(time_ind in range(0, 5) for time_ind, _ in combinations)
+    - all(size_ind in range(0, 4) for _, size_ind in combinations)
+    """
+    article_series = get_article_series()
+    fig = build_figure(article_series, [], '')
+
+    if timings is None:
+        timings = {}
+
+    img_names = []
+    frames = []
+    fingerprints = []
+    for time_ind, size_ind in combinations:
+        start = time.perf_counter()
+        img_name = graph_filename(time_ind, size_ind, out_dir)
+        img_names.append(img_name)
+
+        bankruptcy_series, bankruptcy_name = get_bankruptcy_series(time_ind, size_ind)
+        fingerprint = graph_fingerprint(article_series, bankruptcy_series, bankruptcy_name)
+        rendered = not (incremental and is_graph_current(img_name, fingerprint))
+        if rendered:
+            fig.data[1].update(y=bankruptcy_series, name=bankruptcy_name)
+            frames.append((fig.to_dict(), img_name))
+            fingerprints.append(fingerprint)
+
+        timings[img_name] = {'fingerprint': fingerprint, 'rendered': rendered,
+                             'seconds': time.perf_counter() - start}
+
+    if frames:
+        start = time.perf_counter()
+        write_images([frame for frame, _ in frames], [img_name for _, img_name in frames])
+        share = (time.perf_counter() - start) / len(frames)
+        for _, img_name in frames:
+            timings[img_name]['seconds'] += share
+
+    for (_, img_name), fingerprint in zip(frames, fingerprints):
+        record_graph(img_name, fingerprint)
+
+    return img_names
+
+
+def write_images(figures: list[dict], img_names: list[str]) -> None:
+    """
+    Saves every figure in figures as a png image, with the name at the same index in
+    img_names. With kaleido 1.0 or newer, all the images are rendered in one kaleido
+    session, otherwise they are written one at a time.
+
+    Preconditions:
+    - len(figures) == len(img_names)
+    """
+    if hasattr(pio, 'write_images'):
+        pio.write_images(figures, img_names, format='png', validate=False)
+    else:
+        for figure, img_name in zip(figures, img_names):
+            pio.write_image(figure, img_name, format='png', validate=False)
+
+
+def write_animation(combinations: list[tuple[int, int]], file_name: str) -> None:
+    """
+    Saves the graphs of every (time_ind, size_ind) in combinations as a single html
+    page with one animation frame per graph, and a slider to move between them.
+
+    Preconditions:
+    - combinations != []
+    - all(time_ind in range(0, 5) for time_ind, _ in combinations)
+    - all(size_ind in range(0, 4) for _, size_ind in combinations)
+    """
+    series = [get_bankruptcy_series(time_ind, size_ind) for time_ind, size_ind in combinations]
+    fig = build_figure(get_article_series(), *series[0])
+
+    names = [f'{time_ind}_{size_ind}' for time_ind, size_ind in combinations]
+    fig.frames = [go.Frame(data=[go.Bar(y=y, name=name)], traces=[1], name=frame_name)
+                  for (y, name), frame_name in zip(series, names)]
+
+    fig.update_layout(sliders=[{
+        'currentvalue': {'prefix': 'graph '},
+        'steps': [{'label': frame_name, 'method': 'animate',
+                   'args': [[frame_name], {'mode': 'immediate', 'frame': {'duration': 0}}]}
+                  for frame_name in names]
+    }])
+    fig.write_html(file_name)
+
+
+def get_bankruptcy_series(time_ind: int, size_ind: int) -> tuple[list[float], str]:
+    """
+    Returns the bankruptcy percentage of every survey for the given time until
+    bankruptcy and number of employees, and the name of the trace showing them.
+
     Preconditions:
-    - time_ind in range(0, 6)
+    - time_ind in range(0, 5)
     - size_ind in range(0, 4)
     """
+    sample_time = b.LENGTH_OF_TIME_STR[time_ind]
+    sample_size = b.EMPLOYEE_SIZE[size_ind]
 
-    filtered_data = b.load_data()
+    bankruptcy_series = [b.lookup_bankruptcy_value(date, time_length=sample_time,
+                                                   employee_size=sample_size)
+                         for date in b.SURVEY_DATES]
+    bankruptcy_name = f'%age of businesses with {sample_size} <br> bankrupt in {sample_time}'
 
+    return bankruptcy_series, bankruptcy_name
+
+
+def build_figure(article_series: list[float], bankruptcy_series: list[float],
+                 bankruptcy_name: str) -> go.Figure:
+    """
+    Returns the double bar graph of article_series and bankruptcy_series.
+    """
     # fig = go.Figure()
     fig = make_subplots(rows=1, cols=1)
 
     fig.add_trace(
         go.Bar(
             x=[d.date() for d in PUBLISH_DATES],
-            y=[get_percentage_for_quarter(i) for i in range(5)],
+            y=article_series,
             name='%age of positive articles',
             showlegend=True,
         ),
         row=1, col=1
     )
 
-    sample_time = b.LENGTH_OF_TIME_STR[time_ind]
-    sample_size = b.EMPLOYEE_SIZE[size_ind]
     fig.add_trace(
         go.Bar(
             x=[d.date() for d in PUBLISH_DATES],
-            y=[b.bankruptcy_value(data, time_length=sample_time, 
-                                  employee_size=sample_size) for data in filtered_data],
-            name=f'%age of businesses with {sample_size} <br> bankrupt in {sample_time}'
+            y=bankruptcy_series,
+            name=bankruptcy_name
         ),
         row=1, col=1
     )
 
-    fig.update_layout(
-        title="Positive Media Representation vs Time until Bankruptcy",
-        xaxis=dict(type='category'),
-        yaxis={
-            'title': 'Percentage'
-        },
-    )
+    fig.update_layout(**GRAPH_LAYOUT)
 
-    img_name = f'graphs/graph{time_ind}_{size_ind}.png'
-    fig.write_image(img_name, format='png')
-    return img_name
+    return fig
+
+
+def graph_fingerprint(article_series: list[float], bankruptcy_series: list[float],
+                      bankruptcy_name: str) -> str:
+    """
+    Returns a hash of everything a graph is drawn from: its two series, the name of
+    the bankruptcy series, the x axis labels and GRAPH_LAYOUT.
+    """
+    inputs = {
+        'x': [str(d.date()) for d in PUBLISH_DATES],
+        'articles': article_series,
+        'bankruptcy': bankruptcy_series,
+        'bankruptcy_name': bankruptcy_name,
+        'layout': GRAPH_LAYOUT
+    }
+    encoded = json.dumps(inputs, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def file_digest(file_name: str) -> str:
+    """
+    Returns the sha256 hash of the contents of file_name.
+    """
+    with open(file_name, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def manifest_filename(img_name: str) -> str:
+    """
+    Returns the name of the manifest recording img_name, stored next to it.
+    """
+    return os.path.join(os.path.dirname(img_name), MANIFEST_NAME)
+
+
+def load_manifest(manifest_name: str) -> dict[str, dict[str, str]]:
+    """
+    Returns the contents of the manifest manifest_name, or an empty manifest if it
+    does not exist or cannot be read.
+    """
+    try:
+        with open(manifest_name) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_graph_current(img_name: str, fingerprint: str) -> bool:
+    """
+    Returns whether img_name exists, was drawn from inputs with the given fingerprint,
+    and has not been modified since.
+    """
+    with MANIFEST_LOCK:
+        entry = load_manifest(manifest_filename(img_name)).get(os.path.basename(img_name))
+
+    return entry is not None and entry['fingerprint'] == fingerprint and \
+        os.path.exists(img_name) and file_digest(img_name) == entry['png']
+
+
+def record_graph(img_name: str, fingerprint: str) -> None:
+    """
+    Records in the manifest next to img_name that img_name was drawn from inputs
+    with the given fingerprint.
+    """
+    entry = {'fingerprint': fingerprint, 'png': file_digest(img_name)}
+    manifest_name = manifest_filename(img_name)
+
+    with MANIFEST_LOCK:
+        manifest = load_manifest(manifest_name)
+        manifest[os.path.basename(img_name)] = entry
+
+        tmp_name = manifest_name + '.tmp'
+        with open(tmp_name, 'w') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        os.replace(tmp_name, manifest_name)
 
 
 if __name__ == '__main__':
@@ -1,12 +1,31 @@
 """
 Main module of our program.
 """
+import os
+import threading
+import time
+from collections import OrderedDict, deque
 import pygame
-from typing import Optional
+from typing import Callable, Optional
 from dataclasses import dataclass
 import graphing as g
 import bankruptcy as b
 
+# Number of background threads rendering graphs
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+# Maximum number of decoded graphs kept in memory
+SURFACE_CACHE_SIZE = 16
+
+# Maximum number of frames drawn per second, or None for no limit
+MAX_FPS = 60
+
+# Number of recent frames App.frame_stats is computed over
+FRAME_HISTORY = 120
+
+# Event posted by the renderer when a graph has been rendered
+GRAPH_READY = pygame.USEREVENT + 1
+
 
 @dataclass
 class Button:
@@ -44,6 +63,181 @@ class Image:
     filename: str
 
 
+class GraphRenderer:
+    """
+    Renders graphs with graphing.generate_graph on a pool of background threads.
+    Pending graphs are rendered in priority order (lowest priority value first), and
+    the priorities can be changed while the graphs are waiting.
+
+    A graph whose rendering raises an exception is marked as failed, and the worker
+    thread moves on to the next graph.
+
+    Instance Attributes:
+    - on_ready: Called with the filename of each graph once it has been rendered, or
+      once its rendering has failed
+    """
+    on_ready: Optional[Callable[[str], None]]
+    _pending: dict[tuple[int, int], int]
+    _ready: set[str]
+    _failed: dict[str, str]
+    _closed: bool
+    _condition: threading.Condition
+    _threads: list[threading.Thread]
+
+    def __init__(self, workers: int = RENDER_WORKERS,
+                 on_ready: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Starts the worker threads.
+
+        Preconditions:
+        - workers >= 1
+        """
+        self.on_ready = on_ready
+        self._pending = {}
+        self._ready = set()
+        self._failed = {}
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, time_ind: int, size_ind: int, priority: int) -> None:
+        """
+        Queues the graph for time_ind and size_ind, or changes its priority if it
+        is already waiting. Graphs that have already been rendered are ignored, and
+        graphs that failed are tried again.
+        """
+        with self._condition:
+            filename = g.graph_filename(time_ind, size_ind)
+            if filename not in self._ready:
+                self._failed.pop(filename, None)
+                self._pending[(time_ind, size_ind)] = priority
+                self._condition.notify()
+
+    def prioritize(self, priorities: dict[tuple[int, int], int]) -> None:
+        """
+        Changes the priority of the graphs in priorities that are still waiting.
+        """
+        with self._condition:
+            for job, priority in priorities.items():
+                if job in self._pending:
+                    self._pending[job] = priority
+
+    def is_ready(self, filename: str) -> bool:
+        """
+        Returns whether the graph saved as filename has been rendered.
+        """
+        with self._condition:
+            return filename in self._ready
+
+    def error(self, filename: str) -> Optional[str]:
+        """
+        Returns the error that stopped the graph saved as filename from being rendered,
+        or None if it has not failed.
+        """
+        with self._condition:
+            return self._failed.get(filename)
+
+    def close(self) -> None:
+        """
+        Stops the worker threads once they finish the graph they are rendering.
+        """
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+
+    def _work(self) -> None:
+        """
+        Renders the most urgent pending graph until the renderer is closed.
+        """
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                job = min(self._pending, key=self._pending.get)
+                del self._pending[job]
+
+            filename = g.graph_filename(*job)
+            try:
+                g.generate_graph(*job)
+            except Exception as error:
+                # keep the thread alive for the other graphs
+                with self._condition:
+                    self._failed[filename] = f'{type(error).__name__}: {error}'
+            else:
+                with self._condition:
+                    self._ready.add(filename)
+
+            if self.on_ready is not None:
+                self.on_ready(filename)
+
+
+class SurfaceCache:
+    """
+    Keeps the most recently drawn images decoded in memory, converted to the pixel
+    format of the display. An image is decoded again when its file is replaced.
+
+    Instance Attributes:
+    - max_size: The maximum number of images kept in memory
+    - loads: The number of times an image was read and decoded
+    - hits: The number of times a decoded image was reused
+    """
+    max_size: int
+    loads: int
+    hits: int
+    _surfaces: OrderedDict[str, tuple[tuple[int, int], pygame.Surface]]
+
+    def __init__(self, max_size: int = SURFACE_CACHE_SIZE) -> None:
+        """
+        Preconditions:
+        - max_size >= 1
+        """
+        self.max_size = max_size
+        self.loads = 0
+        self.hits = 0
+        self._surfaces = OrderedDict()
+
+    def get(self, filename: str) -> pygame.Surface:
+        """
+        Returns the decoded image in filename, only reading the file if it is not
+        cached or changed since it was cached.
+
+        Preconditions:
+        - pygame.display.set_mode has been called
+        """
+        stat = os.stat(filename)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self._surfaces.get(filename)
+        if entry is None or entry[0] != version:
+            surface = pygame.image.load(filename).convert()
+            self._surfaces[filename] = (version, surface)
+            self.loads += 1
+        else:
+            surface = entry[1]
+            self.hits += 1
+
+        # the least recently drawn image is evicted first
+        self._surfaces.move_to_end(filename)
+        while len(self._surfaces) > self.max_size:
+            self._surfaces.popitem(last=False)
+
+        return surface
+
+
+def post_graph_ready(filename: str) -> None:
+    """
+    Tells the app that the graph saved as filename has been rendered, waking up its
+    event loop. Safe to call from the renderer's threads.
+    """
+    pygame.event.post(pygame.event.Event(GRAPH_READY, filename=filename))
+
+
 class App:
     """
     Manager class of our app.
@@ -59,6 +253,13 @@ class App:
                  of employees
     - button: A button to be displayed on the screen
     - font: A default font for text rendering
+    - renderer: Renders the graphs in the background
+    - surfaces: The decoded graphs
+    - dirty: Whether the screen needs to be redrawn
+    - max_fps: The maximum number of frames drawn per second, or None for no limit
+    - frame_count: The number of frames drawn so far
+    - frame_times: The time in seconds taken to draw each of the last FRAME_HISTORY frames
+    - text_cache: The rendered text of the buttons, by text and colour
     """
     background_colour = (255, 255, 255)
     width, height = (800, 600)
@@ -73,80 +274,203 @@ class App:
     image_list_by_employee = []
 
     font: pygame.font.SysFont
-
-    def __init__(self) -> None:
+    renderer: GraphRenderer
+    surfaces: SurfaceCache
+    dirty: bool
+    max_fps: Optional[int]
+    frame_count: int
+    frame_times: deque[float]
+    text_cache: dict[tuple[str, tuple[int, int, int]], pygame.Surface]
+
+    # Graphs for different lengths of time until bankruptcy fix employee size = 20-99
+    # employees, graphs for different numbers of employees fix time until bankruptcy
+    # to 6-12 months
+    fixed_size_ind = 2
+    fixed_time_ind = 3
+
+    def __init__(self, max_fps: Optional[int] = MAX_FPS) -> None:
         """
         Initializes pygame and pygame.font. Also sets a default value
         for self.font.
+
+        The graphs are rendered in the background by self.renderer, starting with
+        the graph shown first.
         """
         pygame.init()
         pygame.font.init()
         self.font = pygame.font.SysFont('Corbel', 24)
-
-        # generate graphs for different lengths of time until bankruptcy
+        self.renderer = GraphRenderer(on_ready=post_graph_ready)
+        self.surfaces = SurfaceCache()
+        self.dirty = True
+        self.max_fps = max_fps
+        self.frame_count = 0
+        self.frame_times = deque(maxlen=FRAME_HISTORY)
+        self.text_cache = {}
+
+        # graphs for different lengths of time until bankruptcy
         for i in range(len(b.LENGTH_OF_TIME_STR)):
-            # fix employee size = 20-99 employees
-            img_name = g.generate_graph(i, 2)
+            img_name = g.graph_filename(i, self.fixed_size_ind)
             self.image_list_by_time.append(Image(55, 0, img_name))
 
-        # generate graphs for different numbers of employees
+        # graphs for different numbers of employees
         for i in range(len(b.EMPLOYEE_SIZE)):
-            # fix time until bankruptcy to 6-12 months
-            img_name = g.generate_graph(3, i)
+            img_name = g.graph_filename(self.fixed_time_ind, i)
             self.image_list_by_employee.append(Image(55, 0, img_name))
 
+        for job, priority in self.render_priorities().items():
+            self.renderer.request(*job, priority)
+
+    def render_priorities(self) -> dict[tuple[int, int], int]:
+        """
+        Returns the priority of the (time_ind, size_ind) of every graph: the graph
+        currently shown first, then the graphs after it in the current mode, then the
+        graphs of the other mode.
+        """
+        by_time = [(i, self.fixed_size_ind) for i in range(len(b.LENGTH_OF_TIME_STR))]
+        by_employee = [(self.fixed_time_ind, i) for i in range(len(b.EMPLOYEE_SIZE))]
+        if self.time_mode:
+            current, other = by_time, by_employee
+        else:
+            current, other = by_employee, by_time
+
+        priorities = {}
+        for i in range(len(other)):
+            priorities[other[i]] = len(current) + i
+        for i in range(len(current)):
+            priorities[current[(self.state + i) % len(current)]] = i
+
+        return priorities
+
     def run(self) -> None:
         """
         Runs the app.
 
         The main function of the class, calling this function will open a pygame window
         with the app inside it.
+
+        The screen is only redrawn when the app is dirty, at most self.max_fps times per
+        second. While there is nothing to redraw, the loop waits for the next event.
         """
         screen = pygame.display.set_mode((self.width, self.height))
         pygame.display.set_caption('CS Final Project')
         screen.fill(self.background_colour)
         pygame.display.flip()
 
+        clock = pygame.time.Clock()
+        self.dirty = True
+
         while self.running:
 
-            if self.time_mode:
-                current_img_list = self.image_list_by_time
+            if self.dirty:
+                events = pygame.event.get()
             else:
-                current_img_list = self.image_list_by_employee
+                # nothing to redraw, so sleep until something happens
+                events = [pygame.event.wait()] + pygame.event.get()
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
+            for event in events:
+                self.handle_event(event)
 
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    mouse = pygame.mouse.get_pos()
-                    # Update state if mouse click detected inside button bounds.
-                    if self.button_clicked(self.button_previous, mouse):
-                        self.state = (self.state - 1) % len(current_img_list)
+            if self.dirty and self.running:
+                self.draw_frame(screen)
+                if self.max_fps is not None:
+                    clock.tick(self.max_fps)
 
-                    elif self.button_clicked(self.button_next, mouse):
-                        self.state = (self.state + 1) % len(current_img_list)
+        self.renderer.close()
 
-                    elif self.button_clicked(self.button_switch, mouse):
-                        self.time_mode = not self.time_mode
-                        self.state = 0
+    def current_images(self) -> list[Image]:
+        """
+        Returns the images of the current mode.
+        """
+        if self.time_mode:
+            return self.image_list_by_time
+        else:
+            return self.image_list_by_employee
 
-                        if self.time_mode:
-                            self.button_switch.background_colour = (200, 0, 0)
-                            self.button_switch.text = 'Time Mode'
-                        else:
-                            self.button_switch.background_colour = (0, 200, 0)
-                            self.button_switch.text = 'Employee Mode'
+    def handle_event(self, event: pygame.event.Event) -> None:
+        """
+        Updates the app after event, marking it dirty if the screen needs to be redrawn.
+        """
+        current_img_list = self.current_images()
+
+        if event.type == pygame.QUIT:
+            self.running = False
+
+        elif event.type == GRAPH_READY:
+            if event.filename == current_img_list[self.state].filename:
+                self.dirty = True
+
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.dirty = True
+
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            mouse = pygame.mouse.get_pos()
+            # Update state if mouse click detected inside button bounds.
+            if self.button_clicked(self.button_previous, mouse):
+                self.state = (self.state - 1) % len(current_img_list)
+                self.renderer.prioritize(self.render_priorities())
+                self.dirty = True
+
+            elif self.button_clicked(self.button_next, mouse):
+                self.state = (self.state + 1) % len(current_img_list)
+                self.renderer.prioritize(self.render_priorities())
+                self.dirty = True
+
+            elif self.button_clicked(self.button_switch, mouse):
+                self.time_mode = not self.time_mode
+                self.state = 0
+
+                if self.time_mode:
+                    self.button_switch.background_colour = (200, 0, 0)
+                    self.button_switch.text = 'Time Mode'
+                else:
+                    self.button_switch.background_colour = (0, 200, 0)
+                    self.button_switch.text = 'Employee Mode'
+
+                self.renderer.prioritize(self.render_priorities())
+                self.dirty = True
+
+    def draw_frame(self, screen: pygame.Surface) -> None:
+        """
+        Redraws the whole screen and records how long it took.
+        """
+        start = time.perf_counter()
+
+        # Fill the screen and draw the button
+        screen.fill(self.background_colour)
+        self.draw_button(self.button_previous, screen)
+        self.draw_button(self.button_next, screen)
+        self.draw_button(self.button_switch, screen)
 
-            # Fill the screen and draw the button
-            screen.fill(self.background_colour)
-            self.draw_button(self.button_previous, screen)
-            self.draw_button(self.button_next, screen)
-            self.draw_button(self.button_switch, screen)
+        self.draw_image(self.current_images()[self.state], screen)
 
-            self.draw_image(current_img_list[self.state], screen)
+        pygame.display.update()
 
-            pygame.display.update()
+        self.dirty = False
+        self.frame_count += 1
+        self.frame_times.append(time.perf_counter() - start)
+
+    def frame_stats(self) -> dict[str, float]:
+        """
+        Returns the number of frames drawn, and the mean and longest time in
+        milliseconds taken to draw the last FRAME_HISTORY frames.
+        """
+        if not self.frame_times:
+            return {'frames': 0, 'mean_ms': 0.0, 'max_ms': 0.0}
+
+        return {
+            'frames': self.frame_count,
+            'mean_ms': sum(self.frame_times) / len(self.frame_times) * 1000,
+            'max_ms': max(self.frame_times) * 1000
+        }
+
+    def render_text(self, text: str, colour: tuple[int, int, int]) -> pygame.Surface:
+        """
+        Returns text rendered with self.font, rendering it only the first time.
+        """
+        if (text, colour) not in self.text_cache:
+            self.text_cache[(text, colour)] = self.font.render(text, True, colour)
+
+        return self.text_cache[(text, colour)]
 
     def button_clicked(self, button: Button, mouse: tuple) -> bool:
         """
@@ -171,7 +495,7 @@ class App:
         pygame.draw.rect(screen, button.background_colour, button_rect)
 
         if button.text is not None:
-            text = self.font.render(button.text, True, (255, 255, 255))
+            text = self.render_text(button.text, (255, 255, 255))
             screen.blit(
                 text,
                 (
@@ -182,11 +506,36 @@ class App:
 
     def draw_image(self, image: Image, screen: pygame.Surface) -> None:
         """
-        Load and display the image.
+        Load and display the image, or a placeholder if the graph has not been
+        rendered yet.
         """
-        graph = pygame.image.load(image.filename)
+        if not self.renderer.is_ready(image.filename):
+            self.draw_placeholder(image, screen)
+            return
+
+        graph = self.surfaces.get(image.filename)
         screen.blit(graph, (image.x, image.y))
 
+    def draw_placeholder(self, image: Image, screen: pygame.Surface) -> None:
+        """
+        Draw a grey box with a message where the image will be displayed, or with the
+        error if the graph could not be rendered.
+        """
+        placeholder_rect = pygame.Rect(image.x, image.y, 700, 500)
+        pygame.draw.rect(screen, (230, 230, 230), placeholder_rect)
+
+        error = self.renderer.error(image.filename)
+        if error is None:
+            text = self.render_text('Rendering graph...', (100, 100, 100))
+            screen.blit(text, text.get_rect(center=placeholder_rect.center))
+            return
+
+        title = self.render_text('Could not render graph', (200, 0, 0))
+        screen.blit(title, title.get_rect(midbottom=placeholder_rect.center))
+        # long messages are cut to fit in the box
+        message = self.render_text(error[:80], (100, 100, 100))
+        screen.blit(message, message.get_rect(midtop=placeholder_rect.center))
+
 
 if __name__ == '__main__':
     app = App()
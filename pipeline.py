@@ -0,0 +1,443 @@
+"""
+Builds the FilteredDataset of a source in a single pass over its dataset file.
+
+filtration.store_to_dataclass works on the whole of filtration.BUSINESS_DATA[source]
+at every step: the articles are filtered into one list, sorted into three more, and
+their dates and polarity scores are computed list by list. build_dataset instead
+streams the articles of the dataset file through a chain of stages, one article (or
+one batch of articles) at a time, and only keeps the finished rows:
+
+    read -> business -> dates -> dedup -> ids -> scores -> row of the FilteredDataset
+
+Each stage is a generator function taking the iterator of rows from the previous
+stage and the PipelineContext of the run. Stages are named in STAGES, and
+build_dataset runs DEFAULT_STAGES unless it is given another list of stage names or
+stage functions, so stages can be reordered, left out (e.g. 'business', to keep every
+article) or added with register_stage. The 'dates', 'ids' and 'scores' stages (or
+stages filling in the same fields) are needed to build the dataset.
+
+The 'dedup' stage drops the articles that are exact or near copies of an earlier
+article (see dedup.Deduplicator), before they are scored. The 'exact_dedup' stage,
+which is not in DEFAULT_STAGES, only drops the exact copies. Without either,
+build_dataset(source, ['business', 'dates', 'ids', 'scores']) returns the same
+FilteredDataset as
+    filtration.BUSINESS_DATA[source] = filtration.find_business(source)
+    filtration.store_to_dataclass(source)
+without filling in filtration.BUSINESS_DATA, except that build_dataset also records
+the ids of the articles it left out in rejected_ids, and of the copies it left out
+in duplicate_ids.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import datetime
+import os
+import time
+from typing import Callable, Iterator, Optional, Union
+
+import date_parsers
+import dedup
+import filtration as f
+from polarity_cache import PolarityCache
+import scoring
+
+# Number of articles whose dates are parsed, or whose texts are scored, at a time
+BATCH_SIZE = 1024
+
+
+@dataclass
+class ArticleRow:
+    """
+    An article travelling through the pipeline, and what the stages found out about it.
+
+    Instance Attributes:
+    - article: The article, as read from the dataset file
+    - publish_date: The publish date of the article, set by the 'dates' stage
+    - article_id: The filtration.article_id of the article, set by the 'ids' stage
+    - title_scores: The polarity scores of the title, set by the 'scores' stage
+    - body_scores: The polarity scores of the body, set by the 'scores' stage
+    """
+    article: dict[str, str]
+    publish_date: Optional[datetime.datetime] = None
+    article_id: Optional[str] = None
+    title_scores: Optional[dict[str, float]] = None
+    body_scores: Optional[dict[str, float]] = None
+
+
+@dataclass
+class PipelineContext:
+    """
+    The settings of one run of the pipeline, shared by all of its stages.
+
+    Instance Attributes:
+    - source: The source whose dataset is being built
+    - body_key: The key of the article bodies of source
+    - word_boundary: Whether the business terms only match whole words
+    - batch_size: The number of articles handled at a time by the batched stages
+    - cache: The polarity score cache used by the 'scores' stage, if any
+    - workers: The number of worker processes used to score the texts
+    - executor: The pool of worker processes used to score the texts, if any
+    - segments: If given, long bodies are scored segment by segment under this policy
+      (see scoring.score_texts_segmented)
+    - deduplicator: The Deduplicator used by the 'dedup' stage. It is created by the
+      stage if it is None.
+    - counts: The number of rows that came out of each stage
+    - rejected_ids: The filtration.article_id of the articles dropped by the 'business'
+      and 'dates' stages, which only depend on the article itself (see
+      filtration.FilteredDataset.rejected_ids)
+    - duplicate_ids: The filtration.article_id of the articles dropped as copies by the
+      'dedup' or 'exact_dedup' stage (see filtration.FilteredDataset.duplicate_ids)
+    """
+    source: str
+    body_key: str
+    word_boundary: bool = False
+    batch_size: int = BATCH_SIZE
+    cache: Optional[PolarityCache] = None
+    workers: Optional[int] = None
+    executor: Optional[ProcessPoolExecutor] = None
+    segments: Optional[scoring.SegmentPolicy] = None
+    deduplicator: Optional[dedup.Deduplicator] = None
+    counts: dict[str, int] = field(default_factory=dict)
+    rejected_ids: set[str] = field(default_factory=set)
+    duplicate_ids: set[str] = field(default_factory=set)
+
+
+Stage = Callable[[Iterator[ArticleRow], PipelineContext], Iterator[ArticleRow]]
+
+
+def business_stage(rows: Iterator[ArticleRow], context: PipelineContext) -> \
+        Iterator[ArticleRow]:
+    """Keep the articles related to business, like filtration.iter_business."""
+    matcher = f.get_matcher(context.source, context.word_boundary)
+    for row in rows:
+        if matcher.matches(row.article['title'], row.article[context.body_key]):
+            yield row
+        else:
+            context.rejected_ids.add(f.article_id(context.source, row.article))
+
+
+def dates_stage(rows: Iterator[ArticleRow], context: PipelineContext) -> \
+        Iterator[ArticleRow]:
+    """Parse the publish dates, a batch at a time, and drop the articles whose publish
+    time cannot be parsed (see filtration.parse_publish_dates)."""
+    parser = date_parsers.get_date_parser(f.KEYWORDS[context.source]['date_format'])
+    for batch in _batches(rows, context.batch_size):
+        dates = parser.parse([row.article['publish_time'] for row in batch])
+        for row, date in zip(batch, dates.astype(datetime.datetime).tolist()):
+            if date is not None:
+                row.publish_date = date
+                yield row
+            else:
+                context.rejected_ids.add(f.article_id(context.source, row.article))
+
+
+def dedup_stage(rows: Iterator[ArticleRow], context: PipelineContext) -> \
+        Iterator[ArticleRow]:
+    """Drop the articles that are exact or near copies of an article checked earlier
+    by context.deduplicator, keeping the first copy."""
+    if context.deduplicator is None:
+        context.deduplicator = dedup.Deduplicator()
+
+    for row in rows:
+        text = dedup.article_text(row.article['title'], row.article[context.body_key])
+        if context.deduplicator.check(text) is None:
+            yield row
+        else:
+            context.duplicate_ids.add(f.article_id(context.source, row.article))
+
+
+def exact_dedup_stage(rows: Iterator[ArticleRow], context: PipelineContext) -> \
+        Iterator[ArticleRow]:
+    """Drop the articles that are exact copies (see dedup.exact_key) of an earlier
+    article of this run, keeping the first copy."""
+    seen = set()
+    for row in rows:
+        key = dedup.exact_key(dedup.article_text(row.article['title'],
+                                                 row.article[context.body_key]))
+        if key not in seen:
+            seen.add(key)
+            yield row
+        else:
+            context.duplicate_ids.add(f.article_id(context.source, row.article))
+
+
+def ids_stage(rows: Iterator[ArticleRow], context: PipelineContext) -> Iterator[ArticleRow]:
+    """Compute the article_id of every article."""
+    for row in rows:
+        row.article_id = f.article_id(context.source, row.article)
+        yield row
+
+
+def scores_stage(rows: Iterator[ArticleRow], context: PipelineContext) -> \
+        Iterator[ArticleRow]:
+    """Score the titles and bodies a batch at a time with scoring.score_texts, looking
+    them up in context.cache first. If context.segments is given, the bodies are scored
+    with scoring.score_texts_segmented instead."""
+    for batch in _batches(rows, context.batch_size):
+        titles = [row.article['title'] for row in batch]
+        bodies = [row.article[context.body_key] for row in batch]
+
+        if context.segments is None:
+            scores = scoring.score_texts(titles + bodies, workers=context.workers,
+                                         cache=context.cache, executor=context.executor)
+            title_scores, body_scores = scores[:len(batch)], scores[len(batch):]
+        else:
+            title_scores = scoring.score_texts(titles, workers=context.workers,
+                                               cache=context.cache, executor=context.executor)
+            body_scores = scoring.score_texts_segmented(bodies, context.segments,
+                                                        context.workers, context.cache,
+                                                        context.executor)
+
+        for row, title_score, body_score in zip(batch, title_scores, body_scores):
+            row.title_scores = title_score
+            row.body_scores = body_score
+            yield row
+
+
+# ONLY register_stage() can modify this global variable
+STAGES = {}
+# format: STAGES = {'business': business_stage, ...}
+
+DEFAULT_STAGES = ('business', 'dates', 'dedup', 'ids', 'scores')
+
+
+def register_stage(name: str, stage: Stage) -> None:
+    """Make stage available to build_dataset under name, replacing any stage with
+    that name."""
+    STAGES[name] = stage
+
+
+register_stage('business', business_stage)
+register_stage('dates', dates_stage)
+register_stage('dedup', dedup_stage)
+register_stage('exact_dedup', exact_dedup_stage)
+register_stage('ids', ids_stage)
+register_stage('scores', scores_stage)
+
+
+def run_stages(source: str, stages: list[Union[str, Stage]],
+               context: PipelineContext) -> Iterator[ArticleRow]:
+    """
+    Return the iterator of the rows that come out of the last of stages, when the
+    articles of the dataset file of source go through stages in order.
+
+    Preconditions:
+    - source in f.KEYWORDS
+    - all(stage in STAGES for stage in stages if isinstance(stage, str))
+    """
+    rows = (ArticleRow(article) for article in f.iter_source_articles(source))
+    rows = _counted(rows, 'read', context)
+
+    for stage in stages:
+        if isinstance(stage, str):
+            name, stage = stage, STAGES[stage]
+        else:
+            name = stage.__name__
+        rows = _counted(stage(rows, context), name, context)
+
+    return rows
+
+
+def build_dataset(source: str, stages: Optional[list[Union[str, Stage]]] = None,
+                  use_cache: bool = True, workers: Optional[int] = None,
+                  word_boundary: bool = False, batch_size: int = BATCH_SIZE,
+                  counts: Optional[dict[str, int]] = None,
+                  segments: Optional[scoring.SegmentPolicy] = None,
+                  deduplicator: Optional[dedup.Deduplicator] = None,
+                  save_cache: bool = True) -> f.FilteredDataset:
+    """
+    Return the FilteredDataset of source, built by streaming its dataset file through
+    stages (DEFAULT_STAGES if stages is None) in a single pass.
+
+    If use_cache is True, the polarity scores are looked up in the cache returned by
+    filtration.get_polarity_cache, and the new scores are saved to it unless save_cache
+    is False. The texts are scored by worker processes
+    (all cpus if workers is None) shared by all the batches. If counts is given, the
+    number of rows that came out of each stage is stored in it. If segments is given,
+    long bodies are scored segment by segment under that policy. If deduplicator is
+    given, the 'dedup' stage also drops the copies of the articles it has already
+    checked, so passing the same deduplicator to the builds of several sources drops
+    the stories published by more than one of them.
+
+    Raises ValueError if the stages do not fill in the publish dates, article ids and
+    polarity scores of the rows.
+
+    Preconditions:
+    - source in f.KEYWORDS
+    - workers is None or workers >= 1
+    - batch_size >= 1
+    """
+    if stages is None:
+        stages = DEFAULT_STAGES
+
+    context = PipelineContext(source, f.KEYWORDS[source]['body_key'], word_boundary,
+                              batch_size, workers=workers, segments=segments,
+                              deduplicator=deduplicator)
+    if use_cache:
+        context.cache = f.get_polarity_cache()
+    if workers != 1:
+        context.executor = scoring.start_pool(workers)
+
+    try:
+        filtered_data = _collect(run_stages(source, stages, context), context.body_key)
+        filtered_data.rejected_ids = context.rejected_ids
+        filtered_data.duplicate_ids = context.duplicate_ids
+    finally:
+        if context.executor is not None:
+            context.executor.shutdown()
+
+    if context.cache is not None and save_cache:
+        context.cache.save()
+    if counts is not None:
+        counts.update(context.counts)
+
+    return filtered_data
+
+
+def build_datasets(sources: Optional[list[str]] = None, workers: Optional[int] = None,
+                   use_cache: bool = True,
+                   deduplicator: Optional[dedup.Deduplicator] = None) -> \
+        tuple[dict[str, f.FilteredDataset], dict[str, float]]:
+    """
+    Build the FilteredDataset of every source in sources (every registered source if
+    sources is None) with build_dataset, each source in its own worker process (at
+    most workers processes, all cpus if workers is None), so the sources are
+    processed at the same time. With a single worker, the sources are built one after
+    the other in this process. Return the dataset of each source, and the number of
+    seconds it took to build it.
+
+    Without deduplicator, the copies of an article are only dropped within its source.
+    A Deduplicator cannot be shared by worker processes, so if deduplicator is given,
+    the workers replace the 'dedup' stage with 'exact_dedup', and this process drops
+    the remaining copies (near copies, and copies of the articles of other sources or
+    of deduplicator) once all the sources are built, checking their articles with
+    deduplicator in the order of sources. An exact copy would also have been dropped
+    by deduplicator, whatever happened to the article it copies, so the result is the
+    same as building the sources one after the other with
+    build_dataset(source, deduplicator=deduplicator), except that the remaining
+    copies were scored too.
+
+    The workers read the polarity score cache but do not write to it; the scores they
+    added are merged into the cache and saved by this process once all the sources are
+    built.
+
+    Preconditions:
+    - sources is None or all(source in f.SOURCE_REGISTRY for source in sources)
+    - workers is None or workers >= 1
+    """
+    if sources is None:
+        sources = list(f.SOURCE_REGISTRY)
+
+    # load the analyzer and the cache before starting the workers, so workers forked
+    # from this process inherit them instead of loading them again
+    scoring.get_analyzer()
+    if use_cache:
+        f.get_polarity_cache()
+
+    jobs = [(source, use_cache, deduplicator is None) for source in sources]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        results = [_build_source(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_build_source, jobs))
+
+    datasets = {source: data for source, data, _, _ in results}
+    timings = {source: seconds for source, _, seconds, _ in results}
+
+    if deduplicator is not None:
+        for source in sources:
+            datasets[source] = _drop_copies(datasets[source], deduplicator)
+
+    if use_cache:
+        cache = f.get_polarity_cache()
+        for *_, entries in results:
+            cache.merge(entries)
+        cache.save()
+
+    return datasets, timings
+
+
+def _build_source(job: tuple[str, bool, bool]) -> \
+        tuple[str, f.FilteredDataset, float, list[tuple[bytes, tuple[int, int, int, int]]]]:
+    """Build the dataset of a source in a worker process of build_datasets, scoring its
+    texts in that process, with the 'dedup' stage or only the 'exact_dedup' stage.
+    Also return the new entries of the polarity score cache."""
+    source, use_cache, deduplicate = job
+    stages = [stage if deduplicate or stage != 'dedup' else 'exact_dedup'
+              for stage in DEFAULT_STAGES]
+
+    start = time.perf_counter()
+    data = build_dataset(source, stages, use_cache=use_cache, workers=1, save_cache=False)
+    seconds = time.perf_counter() - start
+
+    entries = f.get_polarity_cache().new_entries() if use_cache else []
+    return source, data, seconds, entries
+
+
+def _drop_copies(data: f.FilteredDataset,
+                 deduplicator: dedup.Deduplicator) -> f.FilteredDataset:
+    """Return data without the articles that deduplicator finds to be copies, like the
+    'dedup' stage would have dropped them, and with their ids added to duplicate_ids."""
+    kept = []
+    copies = set()
+    for i, (title, body) in enumerate(zip(data.titles, data.bodies)):
+        if deduplicator.check(dedup.article_text(title, body)) is None:
+            kept.append(i)
+        else:
+            copies.add(data.article_ids[i])
+    if not copies:
+        return data
+
+    return f.FilteredDataset([data.titles[i] for i in kept],
+                             [data.publish_dates[i] for i in kept],
+                             [data.bodies[i] for i in kept],
+                             [data.title_polarity_scores[i] for i in kept],
+                             [data.body_polarity_scores[i] for i in kept],
+                             [data.article_ids[i] for i in kept],
+                             data.rejected_ids, data.duplicate_ids | copies)
+
+
+def _collect(rows: Iterator[ArticleRow], body_key: str) -> f.FilteredDataset:
+    """Return the FilteredDataset holding rows."""
+    filtered_data = f.FilteredDataset([], [], [], [], [], [])
+
+    for row in rows:
+        if row.publish_date is None or row.article_id is None or \
+                row.title_scores is None or row.body_scores is None:
+            raise ValueError('the pipeline stages must set the publish date, article id '
+                             'and polarity scores of every article')
+
+        filtered_data.titles.append(row.article['title'])
+        filtered_data.publish_dates.append(row.publish_date)
+        filtered_data.bodies.append(row.article[body_key])
+        filtered_data.title_polarity_scores.append(row.title_scores)
+        filtered_data.body_polarity_scores.append(row.body_scores)
+        filtered_data.article_ids.append(row.article_id)
+
+    return filtered_data
+
+
+def _batches(rows: Iterator[ArticleRow], size: int) -> Iterator[list[ArticleRow]]:
+    """Yield the rows in lists of size rows (the last list may be shorter)."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _counted(rows: Iterator[ArticleRow], name: str, context: PipelineContext) -> \
+        Iterator[ArticleRow]:
+    """Return an iterator of rows that counts them in context.counts[name]."""
+    context.counts[name] = 0
+
+    def count() -> Iterator[ArticleRow]:
+        for row in rows:
+            context.counts[name] += 1
+            yield row
+
+    return count()
@@ -0,0 +1,145 @@
+"""
+A persistent, content-addressed cache of VADER polarity scores.
+
+Every article title and body is identified by a hash of its text, so an article
+only has to be scored again when its text changes. The whole cache file is tied to
+a lexicon version (a hash of scoring.lexicon_state(): the nltk version and a hash of
+the VADER lexicon), and is thrown away when either of them changes.
+
+File format:
+- header: the 4 byte magic b'VPC1' followed by the 16 byte lexicon version
+- records: a 16 byte text digest followed by the neg, neu, pos and compound scores,
+  each stored as a little-endian int16 scaled by SCALE. VADER rounds its scores to
+  at most 4 decimal places, so the scaled integers are exact.
+"""
+import hashlib
+import json
+import os
+import struct
+from typing import Optional
+
+MAGIC = b'VPC1'
+DIGEST_SIZE = 16
+SCALE = 10000
+SCORE_KEYS = ('neg', 'neu', 'pos', 'compound')
+
+HEADER = struct.Struct(f'<4s{DIGEST_SIZE}s')
+RECORD = struct.Struct(f'<{DIGEST_SIZE}s4h')
+
+
+def lexicon_version(state: dict[str, str]) -> bytes:
+    """Return the lexicon version identifying state, the value of scoring.lexicon_state()."""
+    return hashlib.blake2b(json.dumps(state, sort_keys=True).encode(),
+                           digest_size=DIGEST_SIZE).digest()
+
+
+def text_digest(text: str) -> bytes:
+    """Return the key of text in the cache."""
+    return hashlib.blake2b(text.encode(), digest_size=DIGEST_SIZE).digest()
+
+
+class PolarityCache:
+    """
+    Maps the hash of a text to the VADER polarity scores of that text.
+
+    Instance Attributes:
+    - file_name: The file the cache is loaded from and saved to
+    - version: The lexicon version the cached scores were computed with
+    - hits: The number of lookups that found a cached score
+    - misses: The number of lookups that did not find a cached score
+    """
+    file_name: str
+    version: bytes
+    hits: int
+    misses: int
+    _scores: dict[bytes, tuple[int, int, int, int]]
+    _pending: list[bytes]
+    _rewrite: bool
+
+    def __init__(self, file_name: str, version: bytes) -> None:
+        """
+        Load the cache stored in file_name. If the file is missing, corrupt or was
+        written with a different lexicon version, start with an empty cache.
+        """
+        self.file_name = file_name
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._scores = {}
+        self._pending = []
+        self._rewrite = True
+
+        if os.path.exists(file_name):
+            self._load()
+
+    def _load(self) -> None:
+        """Read the records of self.file_name into self._scores."""
+        with open(self.file_name, 'rb') as file:
+            raw = file.read()
+
+        if len(raw) < HEADER.size or HEADER.unpack_from(raw) != (MAGIC, self.version):
+            return
+
+        # ignore a partially written trailing record
+        end = HEADER.size + (len(raw) - HEADER.size) // RECORD.size * RECORD.size
+        for key, *scores in RECORD.iter_unpack(raw[HEADER.size:end]):
+            self._scores[key] = tuple(scores)
+
+        self._rewrite = end != len(raw)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def get(self, text: str) -> Optional[dict[str, float]]:
+        """Return the cached polarity scores of text, or None if text has not been scored."""
+        scores = self._scores.get(text_digest(text))
+        if scores is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return {key: value / SCALE for key, value in zip(SCORE_KEYS, scores)}
+
+    def put(self, text: str, scores: dict[str, float]) -> None:
+        """Store the polarity scores of text in the cache."""
+        key = text_digest(text)
+        if key not in self._scores:
+            self._pending.append(key)
+        self._scores[key] = tuple(round(scores[k] * SCALE) for k in SCORE_KEYS)
+
+    def new_entries(self) -> list[tuple[bytes, tuple[int, int, int, int]]]:
+        """Return the entries added since the cache was last saved, for merge."""
+        return [(key, self._scores[key]) for key in self._pending]
+
+    def merge(self, entries: list[tuple[bytes, tuple[int, int, int, int]]]) -> None:
+        """Add the entries returned by new_entries of another cache with the same version
+        (e.g. in a worker process), skipping the texts that are already cached."""
+        for key, scores in entries:
+            if key not in self._scores:
+                self._scores[key] = scores
+                self._pending.append(key)
+
+    def save(self) -> None:
+        """
+        Write the new entries to self.file_name. New records are appended to an
+        existing file, otherwise the whole cache is written to a new file.
+        """
+        if self._rewrite:
+            tmp_name = self.file_name + '.tmp'
+            with open(tmp_name, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, self.version))
+                for key, scores in self._scores.items():
+                    file.write(RECORD.pack(key, *scores))
+            os.replace(tmp_name, self.file_name)
+            self._rewrite = False
+
+        elif self._pending:
+            with open(self.file_name, 'ab') as file:
+                for key in self._pending:
+                    file.write(RECORD.pack(key, *self._scores[key]))
+
+        self._pending = []
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit and miss counters and the number of cached texts."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._scores)}
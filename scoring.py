@@ -0,0 +1,384 @@
+"""
+Scores the polarity of many texts at once by spreading them over a pool of worker
+processes. Each worker process builds its own SentimentIntensityAnalyzer once, and
+texts are sent to the workers in chunks to keep the inter-process overhead low.
+The analyzer is a vader_batch.BatchSentimentIntensityAnalyzer, which scores each
+chunk as one batch and gives the same scores as the stock nltk analyzer.
+
+Small inputs are scored in the calling process, since starting the pool would cost
+more than the scoring itself.
+
+score_texts_segmented scores long texts segment by segment instead: each text is
+split into sentences or paragraphs (see SegmentPolicy), at most max_segments of them
+are scored, and the scores of the segments are averaged, weighted by their length.
+This bounds the time spent on a single huge text, and the segments are cached and
+deduplicated on their own, so segments shared by several texts are only scored once.
+The segments are streamed (see iter_scores_segmented): the texts are split one at a
+time, their segments are scored SEGMENTED_BATCH_SIZE at a time, and the score of a
+text is returned as soon as its last segment is scored, so only the segments waiting
+to be scored are kept in memory.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+from polarity_cache import PolarityCache
+
+if TYPE_CHECKING:
+    from vader_batch import BatchSentimentIntensityAnalyzer
+
+# Where nltk keeps the VADER lexicon
+VADER_LEXICON = 'sentiment/vader_lexicon.zip'
+
+# The file of the lexicon read by the analyzer
+VADER_LEXICON_FILE = VADER_LEXICON + '/vader_lexicon/vader_lexicon.txt'
+
+# Number of texts sent to a worker at a time
+CHUNK_SIZE = 64
+
+# Inputs with fewer texts to score than this are scored without a process pool
+SERIAL_THRESHOLD = 256
+
+# Number of segments scored together by iter_scores_segmented
+SEGMENTED_BATCH_SIZE = 1024
+
+# Where a text is split into segments, for each SegmentPolicy.unit. The spiders write
+# one paragraph per line (see spiders.join_paragraphs); in bodies crawled before that,
+# line breaks only come from the whitespace of the article's html
+SEGMENT_BREAKS = {'sentence': re.compile(r'(?<=[.!?])\s+'),
+                  'paragraph': re.compile(r'\s*\n\s*')}
+
+# ONLY get_analyzer() can modify this global variable
+ANALYZER = {}
+# format: ANALYZER = {'analyzer': BatchSentimentIntensityAnalyzer()}
+ANALYZER_LOCK = threading.Lock()
+
+
+def ensure_vader_lexicon() -> None:
+    """Download the VADER lexicon, unless it is already installed."""
+    import nltk
+
+    try:
+        nltk.data.find(VADER_LEXICON)
+    except LookupError:
+        nltk.download('vader_lexicon', quiet=True)
+
+
+def lexicon_state() -> dict[str, str]:
+    """
+    Return what the scores depend on besides the texts: the nltk version, and a hash
+    of the VADER lexicon (or '' if it is not installed), without creating an analyzer.
+    """
+    import nltk
+
+    try:
+        with nltk.data.find(VADER_LEXICON_FILE).open() as file:
+            lexicon = hashlib.sha256(file.read()).hexdigest()
+    except LookupError:
+        lexicon = ''
+
+    return {'nltk': nltk.__version__, 'lexicon': lexicon}
+
+
+def get_analyzer() -> 'BatchSentimentIntensityAnalyzer':
+    """
+    Return the analyzer shared by this process, creating it (and downloading the
+    lexicon if it is missing) the first time it is requested. Safe to call from
+    several threads.
+
+    nltk is only imported here, since importing it is slow.
+    """
+    with ANALYZER_LOCK:
+        if 'analyzer' not in ANALYZER:
+            from vader_batch import BatchSentimentIntensityAnalyzer
+
+            ensure_vader_lexicon()
+            ANALYZER['analyzer'] = BatchSentimentIntensityAnalyzer()
+
+    return ANALYZER['analyzer']
+
+
+def _init_worker() -> None:
+    """Create the analyzer used by this worker process."""
+    get_analyzer()
+
+
+def _score_chunk(texts: list[str]) -> list[dict[str, float]]:
+    """Score a chunk of texts with the analyzer of this worker process."""
+    return get_analyzer().polarity_scores_batch(texts)
+
+
+def score_serial(texts: list[str]) -> list[dict[str, float]]:
+    """Return the polarity scores of texts, scored as one batch in this process."""
+    return get_analyzer().polarity_scores_batch(texts)
+
+
+def start_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Return a pool of worker processes (all cpus if workers is None) that can be passed
+    to score_parallel and score_texts, so several calls share the same workers. The
+    caller must shut the pool down.
+
+    Preconditions:
+    - workers is None or workers >= 1
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def score_parallel(texts: list[str], workers: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE,
+                   executor: Optional[ProcessPoolExecutor] = None) -> list[dict[str, float]]:
+    """
+    Return the polarity scores of texts, scored by a pool of worker processes.
+    The scores are returned in the same order as texts.
+
+    If executor is given (see start_pool), its workers are used and workers is
+    ignored, otherwise a pool is started for this call.
+
+    Preconditions:
+    - workers is None or workers >= 1
+    - chunk_size >= 1
+    """
+    if executor is None:
+        with start_pool(workers) as executor:
+            return score_parallel(texts, chunk_size=chunk_size, executor=executor)
+
+    chunks = [texts[i: i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    scores = []
+    # executor.map yields the results in the order of chunks
+    for chunk_scores in executor.map(_score_chunk, chunks):
+        scores.extend(chunk_scores)
+
+    return scores
+
+
+def score_texts(texts: list[str], workers: Optional[int] = None,
+                chunk_size: int = CHUNK_SIZE, serial_threshold: int = SERIAL_THRESHOLD,
+                cache: Optional[PolarityCache] = None,
+                executor: Optional[ProcessPoolExecutor] = None) -> list[dict[str, float]]:
+    """
+    Return the polarity score dictionary of every text in texts, in order.
+
+    Texts found in cache are not scored again, and repeated texts are only scored
+    once. The remaining texts are scored by a pool of worker processes (all cpus if
+    workers is None), unless there are fewer than serial_threshold of them or
+    workers == 1, in which case they are scored in this process. New scores are
+    added to cache. If executor is given (see start_pool), it is used instead of
+    starting a new pool.
+
+    Preconditions:
+    - workers is None or workers >= 1
+    - chunk_size >= 1
+    """
+    scores = [None] * len(texts)
+
+    # ACCUMULATOR positions: the indices in texts of every text that still needs scoring
+    positions = {}
+    for i, text in enumerate(texts):
+        cached = cache.get(text) if cache is not None else None
+        if cached is not None:
+            scores[i] = cached
+        else:
+            positions.setdefault(text, []).append(i)
+
+    missing = list(positions)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if not missing:
+        new_scores = []
+    elif workers == 1 or len(missing) < serial_threshold:
+        new_scores = score_serial(missing)
+    else:
+        new_scores = score_parallel(missing, workers, chunk_size, executor)
+
+    for text, score in zip(missing, new_scores):
+        if cache is not None:
+            cache.put(text, score)
+        for i in positions[text]:
+            scores[i] = dict(score)
+
+    return scores
+
+
+@dataclass
+class SegmentPolicy:
+    """
+    How score_texts_segmented splits long texts into segments.
+
+    Representation Invariants:
+    - self.unit in SEGMENT_BREAKS
+    - self.sampling in {'head', 'even'}
+    - self.max_segment_length >= 1
+    - self.max_segments is None or self.max_segments >= 1
+
+    Instance Attributes:
+    - unit: Whether texts are split into sentences or paragraphs
+    - min_length: Texts of at most this many characters are scored whole
+    - max_segment_length: Longer segments are split further at spaces, so no segment
+      is much longer than this
+    - max_segments: The maximum number of segments of a text that are scored, or None
+      to score every segment
+    - sampling: Which segments are scored when a text has more than max_segments:
+      the first ones ('head') or ones spread evenly over the text ('even')
+    """
+    unit: str = 'sentence'
+    min_length: int = 2000
+    max_segment_length: int = 2000
+    max_segments: Optional[int] = None
+    sampling: str = 'even'
+
+
+def split_segments(text: str, policy: SegmentPolicy) -> list[str]:
+    """
+    Return the segments of text that are scored under policy: text itself if it is
+    short, otherwise its sentences or paragraphs, sampled down to policy.max_segments.
+
+    >>> split_segments('Good. Bad! Fine? Ok.', SegmentPolicy(min_length=0))
+    ['Good.', 'Bad!', 'Fine?', 'Ok.']
+    >>> split_segments('Good. Bad! Fine? Ok.', SegmentPolicy(min_length=0, max_segments=2))
+    ['Good.', 'Fine?']
+    """
+    if len(text) <= policy.min_length:
+        return [text]
+
+    segments = []
+    for segment in SEGMENT_BREAKS[policy.unit].split(text):
+        while len(segment) > policy.max_segment_length:
+            cut = segment.rfind(' ', 1, policy.max_segment_length + 1)
+            if cut == -1:
+                cut = policy.max_segment_length
+            segments.append(segment[:cut])
+            segment = segment[cut:].lstrip()
+        if segment:
+            segments.append(segment)
+
+    if not segments:
+        return [text]
+
+    return sample_segments(segments, policy.max_segments, policy.sampling)
+
+
+def sample_segments(segments: list[str], max_segments: Optional[int],
+                    sampling: str = 'even') -> list[str]:
+    """
+    Return at most max_segments of segments, in order: the first ones if sampling is
+    'head', or ones spread evenly over segments if sampling is 'even'.
+
+    Preconditions:
+    - max_segments is None or max_segments >= 1
+    - sampling in {'head', 'even'}
+    """
+    if max_segments is None or len(segments) <= max_segments:
+        return segments
+    elif sampling == 'head':
+        return segments[:max_segments]
+    else:
+        return [segments[i * len(segments) // max_segments] for i in range(max_segments)]
+
+
+def combine_scores(scores: list[dict[str, float]], weights: list[int]) -> dict[str, float]:
+    """
+    Return the average of the polarity scores of the segments of a text, weighted by
+    weights, rounded like VADER rounds its scores.
+
+    >>> combine_scores([{'neg': 0.0, 'neu': 0.5, 'pos': 0.5, 'compound': 0.5},
+    ...                 {'neg': 0.5, 'neu': 0.5, 'pos': 0.0, 'compound': -0.2}], [3, 1])
+    {'neg': 0.125, 'neu': 0.5, 'pos': 0.375, 'compound': 0.325}
+
+    Preconditions:
+    - len(scores) == len(weights) >= 1
+    - sum(weights) > 0
+    """
+    if len(scores) == 1:
+        return dict(scores[0])
+
+    total = sum(weights)
+    combined = {}
+    for key, digits in (('neg', 3), ('neu', 3), ('pos', 3), ('compound', 4)):
+        combined[key] = round(sum(score[key] * weight
+                                  for score, weight in zip(scores, weights)) / total, digits)
+
+    return combined
+
+
+def score_texts_segmented(texts: list[str], policy: Optional[SegmentPolicy] = None,
+                          workers: Optional[int] = None,
+                          cache: Optional[PolarityCache] = None,
+                          executor: Optional[ProcessPoolExecutor] = None,
+                          batch_size: int = SEGMENTED_BATCH_SIZE) -> list[dict[str, float]]:
+    """
+    Return the polarity score dictionary of every text in texts, in order. Texts longer
+    than policy.min_length are split into segments by split_segments, and get the
+    length-weighted average of the scores of their segments (see combine_scores).
+
+    The segments are streamed through iter_scores_segmented, batch_size at a time.
+
+    Preconditions:
+    - workers is None or workers >= 1
+    - batch_size >= 1
+    """
+    return list(iter_scores_segmented(texts, policy, workers, cache, executor, batch_size))
+
+
+def iter_scores_segmented(texts: Iterable[str], policy: Optional[SegmentPolicy] = None,
+                          workers: Optional[int] = None,
+                          cache: Optional[PolarityCache] = None,
+                          executor: Optional[ProcessPoolExecutor] = None,
+                          batch_size: int = SEGMENTED_BATCH_SIZE) -> \
+        Iterator[dict[str, float]]:
+    """
+    Yield the polarity score dictionary of every text of texts, in order, like
+    score_texts_segmented.
+
+    The texts are read from texts and split one at a time, and their segments are
+    scored by score_texts (with workers, cache and executor) as soon as batch_size of
+    them are waiting, so the segments of a text can be scored in several batches. The
+    score of a text is yielded once its last segment is scored, and its segments are
+    dropped. Only the segments waiting to be scored, and the scores of the segments of
+    the texts not yielded yet, are kept in memory.
+
+    Preconditions:
+    - workers is None or workers >= 1
+    - batch_size >= 1
+    """
+    if policy is None:
+        policy = SegmentPolicy()
+
+    # ACCUMULATOR waiting: the segments split from texts that have not been scored yet
+    waiting = []
+    # ACCUMULATOR weights: the segment weights of every text split but not yielded yet
+    weights = deque()
+    # ACCUMULATOR scored: the scores of the scored segments of those texts, in order
+    scored = []
+
+    for text in texts:
+        segments = split_segments(text, policy)
+        weights.append([max(len(segment), 1) for segment in segments])
+        for segment in segments:
+            waiting.append(segment)
+            if len(waiting) == batch_size:
+                scored.extend(score_texts(waiting, workers=workers, cache=cache,
+                                          executor=executor))
+                waiting = []
+                yield from _finished_texts(weights, scored)
+
+    if waiting:
+        scored.extend(score_texts(waiting, workers=workers, cache=cache, executor=executor))
+    yield from _finished_texts(weights, scored)
+
+
+def _finished_texts(weights: deque, scored: list[dict[str, float]]) -> \
+        Iterator[dict[str, float]]:
+    """Yield the combined score of every text at the front of weights whose segments are
+    all in scored, removing the text from weights and its segment scores from scored."""
+    while weights and len(weights[0]) <= len(scored):
+        text_weights = weights.popleft()
+        yield combine_scores(scored[:len(text_weights)], text_weights)
+        del scored[:len(text_weights)]
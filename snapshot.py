@@ -0,0 +1,175 @@
+"""
+Saves processed datasets to disk so they can be loaded without running the
+filtration pipeline again.
+
+A snapshot of a source is a directory holding its columnar.ColumnarDataset:
+- dates.npy, title_scores.npy, body_scores.npy, article_ids.npy, rejected_ids.npy,
+  duplicate_ids.npy: NumPy arrays, loaded memory-mapped. The score arrays have one
+  column per key in columnar.SCORE_KEYS.
+- titles.bin, bodies.bin: the encoded texts, loaded memory-mapped, and
+  title_offsets.npy, body_offsets.npy: where each text starts in them
+- meta.json: the snapshot format version, the number of articles, and the size and
+  modification time of the dataset file, and a hash of the filtration settings,
+  pipeline stages, nltk version and VADER lexicon the snapshot was made from, and of
+  the sources whose articles were checked for copies first. It is written last, so
+  an incomplete snapshot is never loaded.
+
+A snapshot is only loaded while it is fresh: its format version is SNAPSHOT_VERSION
+and the dataset file, the settings of the source and the sentiment analyzer have not
+changed.
+
+Every file is written under a temporary name and then renamed, so datasets loaded
+from the previous snapshot, whose files are memory-mapped, stay readable.
+"""
+import hashlib
+import json
+import mmap
+import os
+from typing import BinaryIO, Callable, Optional
+
+import numpy as np
+
+import columnar as c
+import filtration as f
+import pipeline as p
+import scoring
+
+SNAPSHOT_VERSION = 4
+
+SNAPSHOT_DIR = 'dataset/snapshots'
+
+
+def snapshot_path(source: str, directory: str = SNAPSHOT_DIR) -> str:
+    """Return the directory holding the snapshot of source."""
+    return os.path.join(directory, source)
+
+
+def source_state(source: str, after: tuple[str, ...] = ()) -> dict:
+    """
+    Return what the dataset of source depends on: the size and modification time of
+    its file, and a hash of its filtration settings, of the pipeline stages that build
+    it, of the nltk version and VADER lexicon that score it, and of after, the sources
+    whose articles were checked for copies before those of source (see
+    graphing.load_datasets).
+
+    Preconditions:
+    - source in f.KEYWORDS
+    """
+    settings = json.dumps([f.KEYWORDS[source], p.DEFAULT_STAGES, scoring.lexicon_state(),
+                           list(after)], sort_keys=True).encode()
+    stat = os.stat(f.KEYWORDS[source]['file_name'])
+    return {
+        'file_size': stat.st_size,
+        'file_mtime_ns': stat.st_mtime_ns,
+        'settings': hashlib.sha256(settings).hexdigest()
+    }
+
+
+def save_snapshot(source: str, data: c.ColumnarDataset, directory: str = SNAPSHOT_DIR,
+                  after: tuple[str, ...] = ()) -> None:
+    """
+    Save data as the snapshot of source, replacing any previous snapshot. after are
+    the sources data was deduplicated against (see source_state).
+
+    Preconditions:
+    - source in f.KEYWORDS
+    - data was made from the current dataset file of source
+    """
+    path = snapshot_path(source, directory)
+    os.makedirs(path, exist_ok=True)
+
+    meta_name = os.path.join(path, 'meta.json')
+    if os.path.exists(meta_name):
+        os.remove(meta_name)
+
+    _save_array(path, 'dates.npy', data.publish_dates.astype('datetime64[s]'))
+    _save_array(path, 'title_scores.npy', _score_matrix(data.title_scores))
+    _save_array(path, 'body_scores.npy', _score_matrix(data.body_scores))
+    _save_array(path, 'article_ids.npy', data.article_ids.astype('S32'))
+    _save_array(path, 'rejected_ids.npy', data.rejected_ids.astype('S32'))
+    _save_array(path, 'duplicate_ids.npy', data.duplicate_ids.astype('S32'))
+
+    for name, blob_name, texts in (('title', 'titles.bin', data.titles),
+                                   ('body', 'bodies.bin', data.bodies)):
+        _save_array(path, f'{name}_offsets.npy', texts.offsets)
+        _replace(path, blob_name, lambda file, blob=texts.data: file.write(blob))
+
+    meta = {'version': SNAPSHOT_VERSION, 'count': len(data), **source_state(source, after)}
+    with open(meta_name, 'w') as file:
+        json.dump(meta, file, indent=2)
+
+
+def load_snapshot(source: str, directory: str = SNAPSHOT_DIR,
+                  after: tuple[str, ...] = ()) -> Optional[c.ColumnarDataset]:
+    """
+    Return the dataset saved in the snapshot of source, or None if there is no fresh
+    snapshot of source that was deduplicated against the sources in after.
+
+    Preconditions:
+    - source in f.KEYWORDS
+    """
+    path = snapshot_path(source, directory)
+
+    try:
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        state = source_state(source, after)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('version') != SNAPSHOT_VERSION or \
+            any(meta.get(key) != value for key, value in state.items()):
+        return None
+
+    try:
+        title_scores = _load_array(path, 'title_scores.npy')
+        body_scores = _load_array(path, 'body_scores.npy')
+        data = c.ColumnarDataset(
+            c.TextBuffer(_load_blob(path, 'titles.bin'), _load_array(path, 'title_offsets.npy')),
+            _load_array(path, 'dates.npy'),
+            c.TextBuffer(_load_blob(path, 'bodies.bin'), _load_array(path, 'body_offsets.npy')),
+            {key: title_scores[:, i] for i, key in enumerate(c.SCORE_KEYS)},
+            {key: body_scores[:, i] for i, key in enumerate(c.SCORE_KEYS)},
+            _load_array(path, 'article_ids.npy'),
+            _load_array(path, 'rejected_ids.npy'),
+            _load_array(path, 'duplicate_ids.npy')
+        )
+    except (OSError, ValueError):
+        return None
+
+    if len(data) != meta['count']:
+        return None
+
+    return data
+
+
+def _score_matrix(scores: dict[str, np.ndarray]) -> np.ndarray:
+    """Return the score columns as one float32 matrix with a column per score key."""
+    return np.stack([scores[key] for key in c.SCORE_KEYS], axis=1).astype(np.float32)
+
+
+def _save_array(path: str, name: str, array: np.ndarray) -> None:
+    """Save array in name."""
+    _replace(path, name, lambda file: np.save(file, array))
+
+
+def _replace(path: str, name: str, write: Callable[[BinaryIO], object]) -> None:
+    """Replace the file name with a new file, written by write. The old file is
+    renamed over instead of being truncated, so its memory maps stay valid."""
+    tmp_name = os.path.join(path, name + '.tmp')
+    with open(tmp_name, 'wb') as file:
+        write(file)
+    os.replace(tmp_name, os.path.join(path, name))
+
+
+def _load_array(path: str, name: str) -> np.ndarray:
+    """Load the array saved in name, memory-mapped."""
+    return np.load(os.path.join(path, name), mmap_mode='r')
+
+
+def _load_blob(path: str, name: str) -> bytes:
+    """Load the bytes saved in name, memory-mapped unless the file is empty."""
+    with open(os.path.join(path, name), 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
@@ -18,6 +18,20 @@ import scrapy
 import json
 
 
+def join_paragraphs(paragraphs: list[list[str]]) -> str:
+    """
+    Return the body made of paragraphs, each given as the list of its text nodes. The
+    text nodes of a paragraph are joined with spaces, as the spiders always joined the
+    text nodes of a body, but each paragraph is on its own line, where
+    scoring.split_segments splits the bodies into paragraphs. Paragraphs without text
+    nodes are left out.
+
+    >>> join_paragraphs([['Sales ', 'rose today.'], [], ['Taxes fell.']])
+    'Sales  rose today.\\nTaxes fell.'
+    """
+    return '\n'.join(' '.join(texts) for texts in paragraphs if texts)
+
+
 class CBCSpider(scrapy.Spider):
     """
     A spider that recursively extracts title, date, and description from CBC articles
@@ -203,7 +217,9 @@ class TheStarSpider(scrapy.Spider):
         """
         Extract the body of an article from TheStar news.
         """
-        body = ' '.join(response.css('p.text-block-container::text').getall())
+        # only the text nodes directly in the paragraphs, like p.text-block-container::text
+        body = join_paragraphs([paragraph.xpath('text()').getall()
+                                for paragraph in response.css('p.text-block-container')])
         date = response.css('span.article__published-date::text').get()
         title = response.css('head title::text').get()
         if body and date and title:
@@ -270,7 +286,9 @@ class GlobalSpider(scrapy.Spider):
         """
         date = response.css('div.c-byline__dates span::text').get()
         title = response.css('head title::text').get()
-        body = ' '.join(response.css('article.l-article__text p::text').getall())
+        # only the text nodes directly in the paragraphs, like article.l-article__text p::text
+        body = join_paragraphs([paragraph.xpath('text()').getall()
+                                for paragraph in response.css('article.l-article__text p')])
         if body and date and title:
             yield {'title': title, 'publish_time': date, 'body': body}
 
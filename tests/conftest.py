@@ -0,0 +1,29 @@
+"""
+Shared setup of the tests.
+
+The project modules are imported from the project root, and read their datasets
+relative to it, so the tests run from there. The helpers the tests import are in
+helpers.py.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import filtration as f  # noqa: E402
+
+
+@pytest.fixture
+def register(monkeypatch):
+    """Return a function registering a source for the duration of the test."""
+    def register_source(config: f.SourceConfig) -> f.SourceConfig:
+        config.label = config.label or config.name.upper()
+        monkeypatch.setitem(f.SOURCE_REGISTRY, config.name, config)
+        monkeypatch.setitem(f.KEYWORDS, config.name, config.settings())
+        return config
+
+    return register_source
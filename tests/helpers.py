@@ -0,0 +1,31 @@
+"""
+Helpers shared by the tests: a marker skipping the tests that score texts when the
+VADER lexicon is not installed, and a writer of dataset files.
+"""
+import json
+
+import pytest
+
+import scoring
+
+
+def vader_installed() -> bool:
+    """Return whether the VADER lexicon is installed."""
+    import nltk
+
+    try:
+        nltk.data.find(scoring.VADER_LEXICON)
+    except LookupError:
+        return False
+    return True
+
+
+requires_vader = pytest.mark.skipif(not vader_installed(),
+                                    reason='the VADER lexicon is not installed')
+
+
+def write_articles(file_name: str, articles: list[dict[str, str]]) -> None:
+    """Write articles to file_name as JSON Lines."""
+    with open(file_name, 'w') as file:
+        for article in articles:
+            file.write(json.dumps(article) + '\n')
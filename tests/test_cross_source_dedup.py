@@ -0,0 +1,111 @@
+"""
+Tests of the deduplication of the graphed sources against each other: a story
+published by several outlets is only counted once, in the first source, both when
+the datasets are built and when they are updated.
+"""
+import functools
+
+import pytest
+
+import dedup
+import filtration as f
+import graphing as g
+import pipeline as p
+import snapshot
+from helpers import requires_vader, write_articles
+
+SYNDICATED = {'title': 'Small businesses brace for new restrictions',
+              'publish_time': '2021-04-01T12:00:00Z',
+              'body': 'Owners of small businesses say the new public health restrictions '
+                      'will cut their sales again, just as customers were coming back.'}
+
+FIRST = [SYNDICATED,
+         {'title': 'Bank rates hold', 'publish_time': '2021-04-02T12:00:00Z',
+          'body': 'The central bank kept its key interest rate at a record low.'}]
+
+SECOND = [{'title': 'Tax filing deadline nears', 'publish_time': '2021-04-03T12:00:00Z',
+           'body': 'Accountants urge people to file their income tax returns early.'},
+          dict(SYNDICATED, title=SYNDICATED['title'].upper())]
+
+
+@pytest.fixture
+def sources(tmp_path, register, monkeypatch) -> list[str]:
+    """Register two graphed sources with their own dataset files, in place of the
+    registered sources, and keep their snapshots and scores in tmp_path."""
+    monkeypatch.setattr(f, 'SOURCE_REGISTRY', {})
+    monkeypatch.setattr(f, 'KEYWORDS', {})
+    for name, articles in (('first', FIRST), ('second', SECOND)):
+        file_name = str(tmp_path / f'{name}.jsonl')
+        write_articles(file_name, articles)
+        register(f.SourceConfig(name, file_name, 'body', f.BUSINESS_TERMS, 'iso'))
+
+    directory = str(tmp_path / 'snapshots')
+    monkeypatch.setattr(snapshot, 'load_snapshot',
+                        functools.partial(snapshot.load_snapshot, directory=directory))
+    monkeypatch.setattr(snapshot, 'save_snapshot',
+                        functools.partial(snapshot.save_snapshot, directory=directory))
+    monkeypatch.setattr(f, 'POLARITY_CACHE_FILE', str(tmp_path / 'polarity_cache.bin'))
+
+    monkeypatch.setattr(g, 'COLUMNS', {})
+    monkeypatch.setattr(g, 'FILTERED', {})
+    return ['first', 'second']
+
+
+def titles(datasets: dict) -> dict[str, list[str]]:
+    """Return the titles of every dataset in datasets."""
+    return {source: list(data.titles) for source, data in datasets.items()}
+
+
+@requires_vader
+def test_syndicated_article_is_kept_once(sources) -> None:
+    """The copy of the syndicated article in the second source is left out."""
+    expected = {'first': [FIRST[0]['title'], FIRST[1]['title']],
+                'second': [SECOND[0]['title']]}
+    assert titles(g.load_datasets(sources)) == expected
+
+    # loaded again from the snapshots
+    assert titles(g.load_datasets(sources)) == expected
+
+
+@requires_vader
+def test_update_drops_syndicated_article(sources, tmp_path) -> None:
+    """A syndicated article added to both sources is only added to the first one, and
+    the updated datasets are the same as datasets built from scratch."""
+    g.get_columns()
+
+    story = {'title': 'Retailers report strong holiday sales',
+             'publish_time': '2021-04-04T12:00:00Z',
+             'body': 'Retailers across the country reported strong holiday sales as '
+                     'shoppers returned to malls and main streets.'}
+    write_articles(str(tmp_path / 'first.jsonl'), FIRST + [story])
+    write_articles(str(tmp_path / 'second.jsonl'), SECOND + [dict(story)])
+
+    assert g.update_datasets() == 1
+    updated = {source: g.get_dataset(source) for source in sources}
+    assert titles(updated)['second'] == [SECOND[0]['title']]
+
+    for path in (tmp_path / 'snapshots').iterdir():
+        (path / 'meta.json').unlink()
+    rebuilt = g.load_datasets(sources)
+    assert {source: data.to_filtered() for source, data in rebuilt.items()} == updated
+
+
+@requires_vader
+def test_parallel_build_matches_sequential_build(sources, tmp_path) -> None:
+    """Building the sources in workers, which only drop exact copies within a source
+    before scoring, keeps the same articles as building them one after the other with
+    a shared Deduplicator."""
+    copy = dict(FIRST[1], title=FIRST[1]['title'].upper())
+    write_articles(str(tmp_path / 'first.jsonl'), FIRST + [copy])
+
+    built, _ = p.build_datasets(sources, workers=1, deduplicator=dedup.Deduplicator())
+
+    deduplicator = dedup.Deduplicator()
+    for source in sources:
+        assert built[source] == p.build_dataset(source, workers=1,
+                                                deduplicator=deduplicator)
+
+    counts = {}
+    p.build_dataset('first', ['business', 'dates', 'exact_dedup', 'ids', 'scores'],
+                    workers=1, counts=counts)
+    assert counts['exact_dedup'] == 2
@@ -0,0 +1,60 @@
+"""
+Tests of filtration.iter_json_array: streaming a JSON array must give the same articles
+as json.load, whatever the read size, and reject the files json.load rejects.
+"""
+import json
+
+import pytest
+
+import filtration as f
+
+MALFORMED = ['', '[', '[1,,2]', '[,1]', '[1,]', '[1 2]', '[1]]', '[1] 2', '[]x',
+             '[{"title": "a"}', '[{"title": "a"},,]', ']']
+
+
+def write(tmp_path, text: str) -> str:
+    """Write text to a file in tmp_path, and return its name."""
+    file_name = str(tmp_path / 'articles.json')
+    with open(file_name, 'w') as file:
+        file.write(text)
+    return file_name
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, f.READ_CHUNK_SIZE])
+@pytest.mark.parametrize('source', ['cbc', 'global', 'star'])
+def test_datasets(source: str, chunk_size: int) -> None:
+    """Every dataset file is read like json.load reads it."""
+    file_name = f.KEYWORDS[source]['file_name']
+    with open(file_name) as file:
+        expected = json.load(file)
+
+    assert list(f.iter_json_array(file_name, chunk_size)) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, f.READ_CHUNK_SIZE])
+@pytest.mark.parametrize('text', ['[]', ' [ ] \n', '[1]', '[1, "a,]", {"b": [1, 2]}]',
+                                  '\n[\n  {"title": "a"} ,\n{"title": "b"}\n]\n',
+                                  '[12345, 6e2, null, true]'])
+def test_valid(tmp_path, text: str, chunk_size: int) -> None:
+    """Arrays with any spacing, nested values and values cut by a read are read whole."""
+    file_name = write(tmp_path, text)
+    assert list(f.iter_json_array(file_name, chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, f.READ_CHUNK_SIZE])
+@pytest.mark.parametrize('text', MALFORMED)
+def test_malformed(tmp_path, text: str, chunk_size: int) -> None:
+    """Missing, extra or misplaced commas and brackets raise a ValueError."""
+    with pytest.raises(ValueError):
+        json.loads(text)
+
+    file_name = write(tmp_path, text)
+    with pytest.raises(ValueError):
+        list(f.iter_json_array(file_name, chunk_size))
+
+
+def test_not_an_array(tmp_path) -> None:
+    """A file holding a single article instead of an array of them raises a ValueError."""
+    file_name = write(tmp_path, '{"title": "a"}')
+    with pytest.raises(ValueError):
+        list(f.iter_json_array(file_name))
@@ -0,0 +1,85 @@
+"""
+Tests of polarity_cache: the binary cache file must load back the saved scores, and
+recover from a file written with another lexicon or cut off in the middle of a record.
+"""
+import os
+
+import polarity_cache
+import scoring
+from polarity_cache import PolarityCache
+
+SCORES = {'good news': {'neg': 0.0, 'neu': 0.256, 'pos': 0.744, 'compound': 0.4404},
+          'bad news': {'neg': 0.778, 'neu': 0.222, 'pos': 0.0, 'compound': -0.5423},
+          '': {'neg': 0.0, 'neu': 0.0, 'pos': 0.0, 'compound': 0.0}}
+
+VERSION = polarity_cache.lexicon_version({'nltk': '3.10.3', 'lexicon': 'a'})
+
+
+def make_cache(file_name: str) -> None:
+    """Save the scores of SCORES to a cache in file_name."""
+    cache = PolarityCache(file_name, VERSION)
+    for text, scores in SCORES.items():
+        cache.put(text, scores)
+    cache.save()
+
+
+def test_round_trip(tmp_path) -> None:
+    """Saved scores are loaded back exactly, and appended entries are kept too."""
+    file_name = str(tmp_path / 'cache.bin')
+    make_cache(file_name)
+
+    cache = PolarityCache(file_name, VERSION)
+    cache.put('more news', SCORES['good news'])
+    cache.save()
+
+    cache = PolarityCache(file_name, VERSION)
+    assert len(cache) == 4
+    for text, scores in SCORES.items():
+        assert cache.get(text) == scores
+    assert cache.get('more news') == SCORES['good news']
+    assert cache.get('other news') is None
+    assert cache.stats() == {'hits': 4, 'misses': 1, 'size': 4}
+
+
+def test_version_mismatch(tmp_path) -> None:
+    """A cache written with another lexicon version is discarded, and replaced on save."""
+    file_name = str(tmp_path / 'cache.bin')
+    make_cache(file_name)
+
+    other = polarity_cache.lexicon_version({'nltk': '3.10.3', 'lexicon': 'b'})
+    cache = PolarityCache(file_name, other)
+    assert len(cache) == 0
+    cache.put('other news', SCORES['bad news'])
+    cache.save()
+
+    assert len(PolarityCache(file_name, VERSION)) == 0
+    cache = PolarityCache(file_name, other)
+    assert len(cache) == 1 and cache.get('other news') == SCORES['bad news']
+
+
+def test_truncated_trailing_record(tmp_path) -> None:
+    """A partially written last record is ignored, and the file is rewritten on save."""
+    file_name = str(tmp_path / 'cache.bin')
+    make_cache(file_name)
+    with open(file_name, 'r+b') as file:
+        file.truncate(os.path.getsize(file_name) - 3)
+
+    cache = PolarityCache(file_name, VERSION)
+    assert len(cache) == 2
+    assert cache.get('good news') == SCORES['good news']
+    assert cache.get('') is None
+    cache.save()
+
+    size = polarity_cache.HEADER.size + 2 * polarity_cache.RECORD.size
+    assert os.path.getsize(file_name) == size
+    assert len(PolarityCache(file_name, VERSION)) == 2
+
+
+def test_version_follows_lexicon_state() -> None:
+    """The cache version changes with the nltk version and with the lexicon."""
+    state = scoring.lexicon_state()
+    version = polarity_cache.lexicon_version(state)
+    assert version == polarity_cache.lexicon_version(dict(state))
+
+    for key in state:
+        assert polarity_cache.lexicon_version({**state, key: 'other'}) != version
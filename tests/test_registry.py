@@ -0,0 +1,29 @@
+"""
+Tests of the source registry: registering a source again, or after graphing is
+imported, takes effect everywhere the source is used.
+"""
+import filtration as f
+import graphing as g
+
+
+def test_matcher_follows_registered_terms(register) -> None:
+    """A source registered again with other terms is matched against the new terms."""
+    config = f.SOURCE_REGISTRY['cbc']
+    assert f.get_matcher('cbc').terms == config.business_terms
+
+    register(f.SourceConfig('cbc', config.file_name, config.body_key, ['hockey'],
+                            config.date_format))
+    assert f.get_matcher('cbc').terms == ['hockey']
+    assert f.get_matcher('cbc').matches('Hockey night')
+
+
+def test_source_registered_later_is_graphed(register) -> None:
+    """Sources registered after graphing is imported are graphed, unless graphed=False."""
+    register(f.SourceConfig('news', 'news.jsonl', 'body', f.BUSINESS_TERMS, 'iso'))
+    register(f.SourceConfig('other', 'other.jsonl', 'body', f.BUSINESS_TERMS, 'iso',
+                            graphed=False))
+
+    sources = g.get_sources()
+    assert sources['NEWS'] == 'news'
+    assert 'other' not in sources.values()
+    assert list(sources.values())[:3] == ['cbc', 'global', 'star']
@@ -0,0 +1,55 @@
+"""
+Tests of the segmented scoring of scoring: the segments are streamed through the
+analyzer in batches, and a text gets the same score whichever batches its segments
+end up in.
+"""
+import pytest
+
+import scoring
+from helpers import requires_vader
+
+TEXTS = ['Good.', '', 'The bank did well. Sales were bad! Taxes fell? ' * 40,
+         'Short and sweet.', 'Awful news.\nGreat news.\n\nFine news.\n' * 60,
+         'no breaks at all ' * 200]
+
+POLICIES = [scoring.SegmentPolicy(min_length=100),
+            scoring.SegmentPolicy('paragraph', min_length=100, max_segments=5),
+            scoring.SegmentPolicy(min_length=100, max_segment_length=50, max_segments=7,
+                                  sampling='head')]
+
+
+def expected_score(text: str, policy: scoring.SegmentPolicy) -> dict[str, float]:
+    """Return the score of text, with its segments scored in a batch of their own."""
+    segments = scoring.split_segments(text, policy)
+    return scoring.combine_scores(scoring.score_serial(segments),
+                                  [max(len(segment), 1) for segment in segments])
+
+
+@requires_vader
+@pytest.mark.parametrize('batch_size', [1, 3, scoring.SEGMENTED_BATCH_SIZE])
+@pytest.mark.parametrize('policy', POLICIES)
+def test_scores_do_not_depend_on_batches(policy: scoring.SegmentPolicy,
+                                         batch_size: int) -> None:
+    """Every text gets the score of its own segments, in order."""
+    expected = [expected_score(text, policy) for text in TEXTS]
+    assert scoring.score_texts_segmented(TEXTS, policy, workers=1,
+                                         batch_size=batch_size) == expected
+
+
+@requires_vader
+def test_texts_are_streamed() -> None:
+    """A text is only read once the scores of the texts before it are yielded, when
+    their segments fill a batch."""
+    policy = scoring.SegmentPolicy(min_length=0)
+    read = []
+
+    def texts():
+        for text in ['Good. Bad.', 'Fine. Ok.', 'Great.']:
+            read.append(text)
+            yield text
+
+    scores = scoring.iter_scores_segmented(texts(), policy, workers=1, batch_size=2)
+    assert next(scores) == expected_score('Good. Bad.', policy)
+    assert read == ['Good. Bad.']
+    assert list(scores) == [expected_score('Fine. Ok.', policy),
+                            expected_score('Great.', policy)]
@@ -0,0 +1,51 @@
+"""
+Tests of snapshot: a snapshot is only loaded while everything it was made from is
+unchanged, and loading one does not decode its texts.
+"""
+import datetime
+
+import columnar as c
+import filtration as f
+import scoring
+import snapshot
+from helpers import write_articles
+
+SCORES = {'neg': 0.0, 'neu': 0.5, 'pos': 0.5, 'compound': 0.4404}
+
+
+def make_snapshot(tmp_path, register) -> str:
+    """Register a source, save a snapshot of a dataset of it, and return the directory
+    of the snapshots."""
+    file_name = str(tmp_path / 'news.jsonl')
+    register(f.SourceConfig('news', file_name, 'body', f.BUSINESS_TERMS, 'iso'))
+    write_articles(file_name, [{'title': 'Bank news', 'body': 'Good news for the bank.',
+                                'publish_time': '2021-03-01T10:00:00Z'}])
+
+    data = f.FilteredDataset(['Bank news'], [datetime.datetime(2021, 3, 1, 10)],
+                             ['Good news for the bank.'], [SCORES], [SCORES], ['0' * 32])
+    directory = str(tmp_path / 'snapshots')
+    snapshot.save_snapshot('news', c.from_filtered(data), directory)
+    return directory
+
+
+def test_snapshot_round_trip(tmp_path, register) -> None:
+    """A fresh snapshot loads the saved dataset, with its texts still encoded."""
+    directory = make_snapshot(tmp_path, register)
+
+    data = snapshot.load_snapshot('news', directory)
+    assert data is not None
+    filtered = data.to_filtered()
+    assert isinstance(filtered.titles, c.TextBuffer)
+    assert filtered.titles == ['Bank news']
+    assert filtered.body_polarity_scores == [SCORES]
+
+
+def test_snapshot_is_stale_when_the_analyzer_changes(tmp_path, register,
+                                                     monkeypatch) -> None:
+    """A snapshot made with another nltk version or lexicon is not loaded."""
+    directory = make_snapshot(tmp_path, register)
+    state = scoring.lexicon_state()
+
+    for key in state:
+        monkeypatch.setattr(scoring, 'lexicon_state', lambda key=key: {**state, key: 'other'})
+        assert snapshot.load_snapshot('news', directory) is None
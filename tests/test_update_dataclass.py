@@ -0,0 +1,93 @@
+"""
+Tests of filtration.update_dataclass: updating a dataset must give the same dataset as
+building it again from the updated dataset file.
+"""
+import dedup
+import filtration as f
+import pipeline as p
+from helpers import requires_vader, write_articles
+
+ARTICLES = [
+    {'title': 'Bank profits rise', 'publish_time': '2021-03-01T10:00:00Z',
+     'body': 'The bank reported strong profits this quarter, and its shares rose sharply.'},
+    {'title': 'Local team wins', 'publish_time': '2021-03-02T10:00:00Z',
+     'body': 'The hockey team won the final game of the season at home.'},
+    {'title': 'Small business owners worry', 'publish_time': '2021-03-03T10:00:00Z',
+     'body': 'Owners fear that the new rules will hurt their sales over the winter.'},
+    {'title': 'Tax changes announced', 'publish_time': 'not a date',
+     'body': 'The province announced tax changes that start next year.'},
+    {'title': 'Market falls', 'publish_time': '2021-03-05T10:00:00Z',
+     'body': 'The stock market fell for a third day as investors sold bank shares.'},
+]
+
+
+def build(source: str) -> f.FilteredDataset:
+    """Return the dataset of source built from scratch, with the default stages."""
+    return p.build_dataset(source, use_cache=False, workers=1,
+                           deduplicator=dedup.Deduplicator())
+
+
+def update(source: str, data: f.FilteredDataset) -> tuple[int, int]:
+    """Update data like graphing.update_datasets does."""
+    return f.update_dataclass(source, data, use_cache=False, workers=1,
+                              deduplicator=dedup.Deduplicator())
+
+
+@requires_vader
+def test_update_matches_full_rebuild(tmp_path, register) -> None:
+    """Edited, removed, new, duplicate and rejected articles are handled like a rebuild."""
+    file_name = str(tmp_path / 'news.jsonl')
+    register(f.SourceConfig('news', file_name, 'body', f.BUSINESS_TERMS, 'iso'))
+
+    write_articles(file_name, ARTICLES)
+    data = build('news')
+    assert len(data.titles) == 3
+    assert len(data.rejected_ids) == 2
+
+    edited = dict(ARTICLES[0], body=ARTICLES[0]['body'] + ' Analysts had expected less.')
+    copy = dict(ARTICLES[4], title='MARKET FALLS')
+    new = {'title': 'Income support extended', 'publish_time': '2021-03-06T10:00:00Z',
+           'body': 'The government extended income support for employees of closed shops.'}
+    sports = {'title': 'Team signs player', 'publish_time': '2021-03-07T10:00:00Z',
+              'body': 'The team signed a new goalie for two seasons.'}
+    write_articles(file_name, [edited] + ARTICLES[1:2] + ARTICLES[3:] + [copy, new, sports])
+
+    added, removed = update('news', data)
+    assert (added, removed) == (2, 2)
+    assert data == build('news')
+    assert data.titles == ['Bank profits rise', 'Market falls', 'Income support extended']
+
+
+@requires_vader
+def test_update_does_not_filter_rejected_articles_again(tmp_path, register,
+                                                        monkeypatch) -> None:
+    """Only the articles that were not processed before are matched against the terms
+    and have their publish time parsed, including the articles left out as copies."""
+    file_name = str(tmp_path / 'news.jsonl')
+    register(f.SourceConfig('news', file_name, 'body', f.BUSINESS_TERMS, 'iso'))
+    copy = dict(ARTICLES[4], title='MARKET FALLS')
+    write_articles(file_name, ARTICLES + [copy])
+    data = build('news')
+    assert data.duplicate_ids == {f.article_id('news', copy)}
+
+    matched = []
+    matches = f.TermMatcher.matches
+    monkeypatch.setattr(f.TermMatcher, 'matches',
+                        lambda self, *texts: matched.append(texts) or matches(self, *texts))
+    parsed = []
+    parse_publish_dates = f.parse_publish_dates
+    monkeypatch.setattr(f, 'parse_publish_dates',
+                        lambda source, articles: parsed.extend(articles) or
+                        parse_publish_dates(source, articles))
+
+    assert update('news', data) == (0, 0)
+    assert matched == [] and parsed == []
+    assert data == build('news')
+
+    # without the article it copies, the copy is kept
+    matched.clear()
+    write_articles(file_name, ARTICLES[:4] + [copy])
+    assert update('news', data) == (1, 1)
+    assert matched == [] and parsed == [copy]
+    assert data == build('news')
+    assert data.titles[-1] == 'MARKET FALLS' and data.duplicate_ids == set()
@@ -0,0 +1,88 @@
+"""
+Tests of vader_batch: BatchSentimentIntensityAnalyzer reuses private parts of nltk's
+VADER implementation, so it is checked against the stock analyzer on every text of the
+datasets and on texts exercising the tokenizer and the rules of VADER.
+"""
+import random
+
+import pytest
+
+import filtration as f
+import scoring
+import vader_batch
+from helpers import requires_vader
+
+EDGE_CASES = vader_batch.EXAMPLES + [
+    ' ', '\t\n', '!', '!!!', '???', '?!', ':)', ':-(', '<3', '...', '"', "'", '--',
+    'GOOD', 'Good', 'good!', '!good', '!!good!!', '"good"', "'good'", 'good.bad', 'good-bad',
+    'not good', 'NOT GOOD', "isn't good", "isnt good", "don't like", 'never good', 'no good',
+    'without doubt', 'kind of good', 'kind of', 'sort of', 'at least', 'least good',
+    'very very good', 'VERY good', 'very GOOD', 'hardly', 'but', 'but good', 'good but',
+    'good but bad but good', 'the shit', 'the bomb', 'bad ass', 'yeah right', 'cut the mustard',
+    'good ' * 300, 'Bad! ' * 50, 'GOOD bad GOOD bad', 'été heureux', 'café good',
+    '\U0001F600 happy \U0001F622', 'good bad', 'good—bad', '100% good', '$$$ money',
+    'tax, tax; TAX: tax! tax? (tax) [tax] {tax}', 'a b c d e f g', 'ok OK Ok oK',
+]
+
+# Punctuation placed around the words of the datasets by test_random_texts
+MARKS = ['', '', '', '!', '?', '.', ',', '"', "'", '!!', '?!', '...', '(', ')', ':', '-']
+
+
+def dataset_texts() -> list[str]:
+    """Return the titles and bodies of every article of every registered source."""
+    texts = []
+    for source in f.KEYWORDS:
+        body_key = f.KEYWORDS[source]['body_key']
+        for article in f.iter_source_articles(source):
+            texts.append(article['title'])
+            texts.append(article[body_key])
+
+    return texts
+
+
+def assert_same_scores(texts: list[str], batch_size: int = scoring.CHUNK_SIZE) -> None:
+    """Check that the batch analyzer scores texts, in batches of batch_size, exactly like
+    the stock analyzer."""
+    from nltk.sentiment import SentimentIntensityAnalyzer
+
+    stock = SentimentIntensityAnalyzer()
+    batch = vader_batch.BatchSentimentIntensityAnalyzer()
+
+    for i in range(0, len(texts), batch_size):
+        chunk = texts[i: i + batch_size]
+        for text, actual in zip(chunk, batch.polarity_scores_batch(chunk)):
+            assert actual == stock.polarity_scores(text), text
+
+
+@requires_vader
+@pytest.mark.parametrize('batch_size', [1, scoring.CHUNK_SIZE])
+def test_edge_cases(batch_size: int) -> None:
+    """Short, empty, punctuated, non-ascii and rule-triggering texts."""
+    assert_same_scores(EDGE_CASES, batch_size)
+
+
+@requires_vader
+def test_dataset_texts() -> None:
+    """Every title and body of the datasets."""
+    assert_same_scores(dataset_texts())
+
+
+@requires_vader
+def test_random_texts() -> None:
+    """Texts made of dataset words and lexicon words in random case and punctuation."""
+    generator = random.Random(110)
+    analyzer = vader_batch.BatchSentimentIntensityAnalyzer()
+    words = sorted(analyzer.lexicon)[::50] + list(analyzer.constants.BOOSTER_DICT) + \
+        list(analyzer.constants.NEGATE) + ['but', 'kind', 'of', 'least', 'at', 'very']
+    for text in dataset_texts()[:200]:
+        words.extend(text.split()[:20])
+
+    texts = []
+    for _ in range(2000):
+        tokens = []
+        for word in generator.choices(words, k=generator.randint(1, 25)):
+            word = generator.choice([word, word.upper(), word.capitalize()])
+            tokens.append(generator.choice(MARKS) + word + generator.choice(MARKS))
+        texts.append(' '.join(tokens))
+
+    assert_same_scores(texts)
@@ -0,0 +1,189 @@
+"""
+A SentimentIntensityAnalyzer that scores a whole batch of texts at once, and gives
+exactly the same scores as the stock nltk analyzer.
+
+For every text, the stock analyzer builds a dictionary of every word of the text
+combined with every punctuation mark in VaderConstants.PUNC_LIST to strip the
+punctuation around the words, lowercases every word several times, and looks every
+word up in the lexicon. BatchSentimentIntensityAnalyzer instead:
+- splits all the texts of a batch into tokens, and cleans up and looks up each
+  distinct token of the batch only once (see TokenInfo). Whether punctuation is
+  stripped from a token only depends on the token itself, so all the tokens share
+  one table, which is also kept for the next batches (up to TOKEN_TABLE_SIZE tokens).
+- only runs VADER's rules about the surrounding words (boosters, negations, idioms,
+  'but', ...) for the words that are in the lexicon, once per distinct word of a
+  text, reusing the nltk implementation of those rules. Like the stock analyzer,
+  every occurrence of a word gets the valence of its first occurrence, and a word
+  that is not in the lexicon has a valence of 0.
+
+>>> from nltk.sentiment import SentimentIntensityAnalyzer
+>>> stock = SentimentIntensityAnalyzer()
+>>> batch = BatchSentimentIntensityAnalyzer()
+>>> batch.polarity_scores_batch(EXAMPLES) == [stock.polarity_scores(t) for t in EXAMPLES]
+True
+>>> batch.polarity_scores('The bank is GREAT, but taxes are not good!!')
+{'neg': 0.271, 'neu': 0.514, 'pos': 0.214, 'compound': -0.1966}
+"""
+import re
+import string
+from typing import NamedTuple, Optional
+
+from nltk.sentiment import SentimentIntensityAnalyzer
+
+# Texts that exercise every rule of VADER, used to check the batch analyzer against
+# the stock analyzer
+EXAMPLES = [
+    '',
+    'a',
+    'The company is doing well.',
+    'The company is NOT doing well, but the bank is VERY happy!!!',
+    'Sales were kind of good, sort of bad and at least not terrible???',
+    "It isn't the best market, it's the worst; never so happy, never this sad.",
+    'That deal was the bomb. Yeah right, the shit. Kiss of death for bad ass shops',
+    'GREAT GREAT GREAT profits!?!? :) :-( <3 ... "good" \'bad\' -nice- ,happy,',
+    'least happy, very least happy, at least happy, not least sad, but BUT but',
+    'Employees cut the mustard?! Hand to mouth, living hand to mouth!',
+    'extremely, Extremely EXTREMELY good and hardly bad; Barely sad?? Kinda happy',
+    'Money money MONEY money!!!!! Tax tax tax. income: income; "income"',
+]
+
+PUNCTUATION = string.punctuation
+
+# The number of distinct tokens an analyzer remembers between batches
+TOKEN_TABLE_SIZE = 200_000
+
+
+class TokenInfo(NamedTuple):
+    """
+    What the analyzer needs to know about a token of a text.
+
+    Instance Attributes:
+    - word: The token, without the punctuation the stock analyzer strips from it
+    - lower: word in lowercase
+    - in_lexicon: Whether lower is in the lexicon
+    - is_upper: Whether word is in ALL CAPS
+    - is_booster: Whether lower is a booster or dampener word
+    """
+    word: str
+    lower: str
+    in_lexicon: bool
+    is_upper: bool
+    is_booster: bool
+
+
+class _SentiTextView:
+    """The attributes of nltk's SentiText that the valence rules read."""
+    words_and_emoticons: list[str]
+    is_cap_diff: bool
+
+    def __init__(self, words_and_emoticons: list[str], is_cap_diff: bool) -> None:
+        self.words_and_emoticons = words_and_emoticons
+        self.is_cap_diff = is_cap_diff
+
+
+class BatchSentimentIntensityAnalyzer(SentimentIntensityAnalyzer):
+    """
+    A SentimentIntensityAnalyzer with a batch scoring method, polarity_scores_batch.
+    polarity_scores scores its text as a batch of one.
+    """
+    _punctuation: re.Pattern
+    _punc_set: frozenset[str]
+    _tokens: dict[str, Optional[TokenInfo]]
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._punctuation = self.constants.REGEX_REMOVE_PUNCTUATION
+        self._punc_set = frozenset(self.constants.PUNC_LIST)
+        # the TokenInfo of every distinct token seen so far, or None for the tokens
+        # the stock analyzer drops
+        self._tokens = {}
+
+    def polarity_scores(self, text: str) -> dict[str, float]:
+        """Return the polarity scores of text, like SentimentIntensityAnalyzer does."""
+        return self.polarity_scores_batch([text])[0]
+
+    def polarity_scores_batch(self, texts: list[str]) -> list[dict[str, float]]:
+        """Return the polarity scores of every text in texts, in order."""
+        if len(self._tokens) > TOKEN_TABLE_SIZE:
+            self._tokens.clear()
+        tokens = self._tokens
+        scores = []
+
+        for text in texts:
+            if not isinstance(text, str):
+                text = str(text.encode('utf-8'))
+
+            infos = []
+            for token in text.split():
+                if token not in tokens:
+                    tokens[token] = self.token_info(token)
+                info = tokens[token]
+                if info is not None:
+                    infos.append(info)
+
+            scores.append(self._score_tokens(text, infos))
+
+        return scores
+
+    def token_info(self, token: str) -> Optional[TokenInfo]:
+        """
+        Return the TokenInfo of a whitespace separated token, or None if the stock
+        analyzer ignores the token because it is a single character.
+
+        The stock analyzer strips the punctuation from a token when the token is a word
+        of more than one character (with no punctuation) preceded or followed by one of
+        the marks in PUNC_LIST.
+        """
+        if len(token) <= 1:
+            return None
+
+        word = token
+        lead = len(token) - len(token.lstrip(PUNCTUATION))
+        trail = len(token) - len(token.rstrip(PUNCTUATION))
+        if 0 < lead < len(token) and self._is_stripped(token[:lead], token[lead:]):
+            word = token[lead:]
+        elif 0 < trail < len(token) and self._is_stripped(token[-trail:], token[:-trail]):
+            word = token[:-trail]
+
+        lower = word.lower()
+        return TokenInfo(word, lower, lower in self.lexicon, word.isupper(),
+                         lower in self.constants.BOOSTER_DICT)
+
+    def _is_stripped(self, mark: str, word: str) -> bool:
+        """Return whether the stock analyzer strips mark from word."""
+        return mark in self._punc_set and len(word) > 1 and \
+            self._punctuation.search(word) is None
+
+    def _score_tokens(self, text: str, infos: list[TokenInfo]) -> dict[str, float]:
+        """Return the polarity scores of text, whose tokens are infos."""
+        words = [info.word for info in infos]
+        lowers = [info.lower for info in infos]
+
+        upper_count = sum(info.is_upper for info in infos)
+        is_cap_diff = 0 < len(infos) - upper_count < len(infos)
+
+        # every occurrence of a word is scored like its first occurrence
+        first_index = {}
+        for i, word in enumerate(words):
+            if word not in first_index:
+                first_index[word] = i
+
+        view = _SentiTextView(words, is_cap_diff)
+        valences = {}
+        for word, i in first_index.items():
+            info = infos[i]
+            if info.is_booster or not info.in_lexicon or \
+                    (info.lower == 'kind' and i < len(words) - 1 and lowers[i + 1] == 'of'):
+                valences[word] = 0
+            else:
+                valences[word] = self.sentiment_valence(0, view, word, i, [])[0]
+
+        sentiments = [valences[word] for word in words]
+        sentiments = self._but_check(lowers, sentiments)
+
+        return self.score_valence(sentiments, text)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()